@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+ADMIN STATISTICS SNAPSHOT
+Counters for /admin computed in one pass and refreshed in the background
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class AdminStatsSnapshot:
+    """Periodically refreshed copy of the admin panel counters"""
+
+    def __init__(self, db, max_age=None):
+        self.db = db
+        self.max_age = float(max_age or os.getenv("ADMIN_STATS_MAX_AGE", 60))
+        self.stats = None
+        self.as_of = None
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def is_stale(self):
+        if self.as_of is None:
+            return True
+        return (datetime.now() - self.as_of).total_seconds() >= self.max_age
+
+    async def refresh(self):
+        """Re-query the counters; concurrent callers share one query"""
+        started = datetime.now()
+        async with self._lock:
+            # Someone else refreshed while we waited
+            if self.as_of is not None and self.as_of >= started:
+                return self.stats
+            self.stats = await self.db.admin_stats()
+            self.as_of = datetime.now()
+            return self.stats
+
+    async def get(self, force=False):
+        """Return (stats, as_of), re-querying only when stale"""
+        if force or self.is_stale():
+            await self.refresh()
+        return self.stats, self.as_of
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Admin stats refresh failed: {e}")
+            await asyncio.sleep(self.max_age)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
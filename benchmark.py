@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+LOAD TEST / BENCHMARK HARNESS
+Drives main_bot's Application with synthetic update floods from a fake Bot API
+server against a throwaway local Postgres
+
+    python benchmark.py --updates 5000 --users 1000
+    python benchmark.py --database-url postgresql://... --save baseline.json
+    python benchmark.py --compare baseline.json
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import random
+import shutil
+import socket
+import asyncio
+import logging
+import argparse
+import tempfile
+import subprocess
+import contextlib
+from collections import Counter, deque
+from urllib.parse import parse_qs
+
+from telegram.ext import Application
+
+from webhook import HTTPServer
+
+BENCH_TOKEN = "123456:BENCHMARK"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+FIRST_USER_ID = 10_000_000
+
+# Relative weight of each synthetic update kind
+DEFAULT_MIX = "start=2,dashboard=3,referral=1,callback=4"
+CALLBACKS = ["my_dashboard", "refresh_dash", "buy_premium", "plan:pro", "referral", "deploy_bot"]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+# ==================== FAKE BOT API ====================
+
+class FakeBotAPI:
+    """Just enough of the Bot API for polling and replying.
+
+    Updates handed to feed() are served through getUpdates; every other call
+    is counted and answered with a plausible result.
+    """
+
+    def __init__(self, token=BENCH_TOKEN, port=None):
+        self.token = token
+        self.port = port or free_port()
+        self.server = HTTPServer("127.0.0.1", self.port)
+        self.pending = deque()
+        self.delivered = {}
+        self.calls = Counter()
+        self._arrived = asyncio.Event()
+        self._closing = False
+        self._message_id = 0
+
+        results = {
+            "getMe": lambda p: BOT_USER,
+            "getUpdates": None,
+            "sendMessage": self._message,
+            "editMessageText": self._message,
+            "editMessageReplyMarkup": self._message,
+            "answerCallbackQuery": lambda p: True,
+            "deleteMessage": lambda p: True,
+            "deleteWebhook": lambda p: True,
+            "setWebhook": lambda p: True
+        }
+        for method, result in results.items():
+            handler = self._get_updates if method == "getUpdates" else self._route(method, result)
+            self.server.add_route(f"/bot{token}/{method}", handler)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    async def start(self):
+        await self.server.start()
+
+    async def stop(self):
+        self._closing = True
+        # Answer waiting long polls now instead of when their timeout runs out
+        self._arrived.set()
+        await self.server.stop()
+
+    @staticmethod
+    def _params(body):
+        params = {}
+        for key, values in parse_qs(body.decode()).items():
+            try:
+                params[key] = json.loads(values[0])
+            except ValueError:
+                params[key] = values[0]
+        return params
+
+    @staticmethod
+    def _ok(result):
+        return 200, json.dumps({"ok": True, "result": result}).encode(), "application/json"
+
+    def _message(self, params):
+        self._message_id += 1
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(params.get("chat_id") or 0), "type": "private"},
+            "from": BOT_USER,
+            "text": str(params.get("text", ""))
+        }
+
+    def _route(self, method, result):
+        async def handle(http_method, headers, body):
+            self.calls[method] += 1
+            return self._ok(result(self._params(body)))
+        return handle
+
+    async def _get_updates(self, http_method, headers, body):
+        self.calls["getUpdates"] += 1
+        params = self._params(body)
+        offset = int(params.get("offset") or 0)
+        while self.pending and self.pending[0]["update_id"] < offset:
+            self.pending.popleft()
+        if not self.pending and not self._closing:
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), min(float(params.get("timeout") or 0), 1.0))
+            except asyncio.TimeoutError:
+                pass
+        batch = list(self.pending)[:int(params.get("limit") or 100)]
+        now = time.perf_counter()
+        for update in batch:
+            self.delivered.setdefault(update["update_id"], now)
+        return self._ok(batch)
+
+    def feed(self, updates):
+        self.pending.extend(updates)
+        self._arrived.set()
+
+
+# ==================== SYNTHETIC UPDATES ====================
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def synthetic_updates(count, users, mix, seed=0):
+    """Update dicts; each user's first update is /start"""
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    seen = set()
+    updates = []
+    now = int(time.time())
+    for update_id in range(1, count + 1):
+        user_id = FIRST_USER_ID + rng.randrange(users)
+        user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+        chat = {"id": user_id, "type": "private"}
+        kind = rng.choices(kinds, weights)[0] if user_id in seen else "start"
+        seen.add(user_id)
+
+        if kind == "callback":
+            updates.append({"update_id": update_id, "callback_query": {
+                "id": str(update_id),
+                "from": user,
+                "chat_instance": str(user_id),
+                "data": rng.choice(CALLBACKS),
+                "message": {"message_id": update_id, "date": now, "chat": chat, "from": BOT_USER, "text": "menu"}
+            }})
+            continue
+
+        command = "/" + kind
+        text = command
+        if kind == "start" and rng.random() < 0.3:
+            # Some users arrive through a referral link
+            text += f" {FIRST_USER_ID + rng.randrange(users)}"
+        updates.append({"update_id": update_id, "message": {
+            "message_id": update_id,
+            "date": now,
+            "chat": chat,
+            "from": user,
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        }})
+    return updates
+
+
+# ==================== THROWAWAY POSTGRES ====================
+
+def postgres_bindir():
+    initdb = shutil.which("initdb")
+    if initdb:
+        return os.path.dirname(initdb)
+    candidates = sorted(glob.glob("/usr/lib/postgresql/*/bin"))
+    return candidates[-1] if candidates else None
+
+
+@contextlib.contextmanager
+def temporary_postgres():
+    """Start a private Postgres cluster in a temp dir, yields its DSN"""
+    bindir = postgres_bindir()
+    if bindir is None:
+        raise SystemExit("❌ initdb not found - install PostgreSQL or pass --database-url")
+    root = tempfile.mkdtemp(prefix="bench-pg-")
+    data = os.path.join(root, "data")
+    port = free_port()
+    pg_ctl = os.path.join(bindir, "pg_ctl")
+    try:
+        subprocess.run(
+            [os.path.join(bindir, "initdb"), "-D", data, "-U", "postgres", "-A", "trust", "--no-sync"],
+            check=True, capture_output=True, text=True
+        )
+        subprocess.run(
+            [pg_ctl, "-D", data, "-l", os.path.join(root, "postgres.log"), "-w",
+             "-o", f"-p {port} -k {root} -c listen_addresses=127.0.0.1 -c fsync=off", "start"],
+            check=True, capture_output=True, text=True
+        )
+    except subprocess.CalledProcessError as e:
+        shutil.rmtree(root, ignore_errors=True)
+        raise SystemExit(f"❌ Could not start Postgres: {(e.stderr or e.stdout).strip()}")
+    try:
+        yield f"postgresql://postgres@127.0.0.1:{port}/postgres"
+    finally:
+        subprocess.run([pg_ctl, "-D", data, "-m", "immediate", "stop"], capture_output=True)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+# ==================== RUN ====================
+
+class TimedApplication(Application):
+    """Records when each update has been fully processed"""
+
+    finished = {}
+
+    async def process_update(self, update):
+        try:
+            await super().process_update(update)
+        finally:
+            TimedApplication.finished[update.update_id] = time.perf_counter()
+
+
+def _configure_environment(database_url):
+    # Must happen before main_bot is imported: it reads these at import time
+    os.environ["BOT_TOKEN"] = BENCH_TOKEN
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["BOT_MODE"] = "polling"
+
+
+async def run_benchmark(args, database_url):
+    _configure_environment(database_url)
+    import main_bot
+    from metrics import DATABASE, HANDLERS
+
+    # One log line per request would dominate the measurement
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    def db_round_trips():
+        entry = DATABASE.seconds.values.get(("run",))
+        return entry[2] if entry else 0
+
+    api = FakeBotAPI()
+    await api.start()
+    builder = Application.builder().base_url(api.base_url).application_class(TimedApplication)
+    application, allowed_updates = main_bot.build_application(builder)
+    if not args.flood_control:
+        main_bot.flood_control.exempt.update(range(FIRST_USER_ID, FIRST_USER_ID + args.users))
+
+    await application.initialize()
+    # Not post_init: the background services' queries would be counted
+    # against the updates. Migrations finish before the clock starts.
+    await (await main_bot.db.connect())
+    await application.start()
+    await application.updater.start_polling(poll_interval=0, timeout=1, allowed_updates=allowed_updates)
+
+    updates = synthetic_updates(args.updates, args.users, parse_mix(args.mix), args.seed)
+    api_calls_before = sum(api.calls.values()) - api.calls["getUpdates"]
+    db_before = db_round_trips()
+    started = time.perf_counter()
+    try:
+        if args.rate:
+            step = max(1, round(args.rate / 10))
+            for i in range(0, len(updates), step):
+                api.feed(updates[i:i + step])
+                await asyncio.sleep(step / args.rate)
+        else:
+            api.feed(updates)
+
+        deadline = started + args.timeout
+        while len(TimedApplication.finished) < len(updates) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        await main_bot.db.user_writes.flush()
+    finally:
+        await application.updater.stop()
+        await application.stop()
+        await main_bot.db.close()
+        await application.shutdown()
+        await api.stop()
+
+    latencies = [
+        TimedApplication.finished[u] - api.delivered[u]
+        for u in TimedApplication.finished if u in api.delivered
+    ]
+    processed = len(TimedApplication.finished)
+    return {
+        'updates': len(updates),
+        'processed': processed,
+        'seconds': elapsed,
+        'throughput': processed / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p90_ms': percentile(latencies, 90) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': max(latencies, default=0.0) * 1000,
+        'db_round_trips_per_update': (db_round_trips() - db_before) / max(processed, 1),
+        'api_calls_per_update': (sum(api.calls.values()) - api.calls["getUpdates"] - api_calls_before)
+                                / max(processed, 1),
+        'handler_errors': sum(HANDLERS.errors.values.values()),
+        'flood_dropped': main_bot.flood_control.metrics['limited'] + main_bot.flood_control.metrics['coalesced']
+    }
+
+
+def print_report(result, baseline=None):
+    print("\n📊 BENCHMARK RESULTS")
+    print(f"• Updates: {result['processed']}/{result['updates']} in {result['seconds']:.2f}s")
+    rows = [
+        ("Throughput", 'throughput', "{:.1f} updates/s"),
+        ("Latency p50", 'p50_ms', "{:.1f} ms"),
+        ("Latency p90", 'p90_ms', "{:.1f} ms"),
+        ("Latency p99", 'p99_ms', "{:.1f} ms"),
+        ("Latency max", 'max_ms', "{:.1f} ms"),
+        ("DB round-trips/update", 'db_round_trips_per_update', "{:.2f}"),
+        ("Bot API calls/update", 'api_calls_per_update', "{:.2f}"),
+        ("Handler errors", 'handler_errors', "{}"),
+        ("Dropped by flood control", 'flood_dropped', "{}")
+    ]
+    for label, key, fmt in rows:
+        line = f"• {label}: {fmt.format(result[key])}"
+        if baseline and baseline.get(key):
+            line += f" ({(result[key] - baseline[key]) / baseline[key]:+.1%} vs baseline)"
+        print(line)
+
+
+def failures(result):
+    """Reasons the run itself is invalid, whatever its numbers say"""
+    problems = []
+    if result['handler_errors']:
+        problems.append(f"{result['handler_errors']} handler errors")
+    if result['processed'] < result['updates']:
+        problems.append(f"{result['updates'] - result['processed']} updates not processed")
+    return problems
+
+
+def regressions(result, baseline, tolerance):
+    """Metrics that got worse than baseline by more than tolerance"""
+    worse = []
+    if result['throughput'] < baseline['throughput'] * (1 - tolerance):
+        worse.append('throughput')
+    for key in ('p50_ms', 'p99_ms', 'db_round_trips_per_update'):
+        if baseline.get(key) and result[key] > baseline[key] * (1 + tolerance):
+            worse.append(key)
+    return worse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test main_bot against a fake Bot API")
+    parser.add_argument("--updates", type=int, default=5000, help="synthetic updates to send")
+    parser.add_argument("--users", type=int, default=1000, help="distinct synthetic users")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"update kind weights (default {DEFAULT_MIX})")
+    parser.add_argument("--rate", type=float, default=0, help="updates per second, 0 sends one flood")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=300, help="give up after this many seconds")
+    parser.add_argument("--flood-control", action="store_true", help="keep per-user flood control on")
+    parser.add_argument("--verbose", action="store_true", help="keep INFO logging from the bot")
+    parser.add_argument("--database-url", help="use this database instead of a throwaway cluster")
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed regression (default 10%%)")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    if args.database_url:
+        result = asyncio.run(run_benchmark(args, args.database_url))
+    else:
+        with temporary_postgres() as database_url:
+            result = asyncio.run(run_benchmark(args, database_url))
+
+    print_report(result, baseline)
+    problems = failures(result)
+    if problems:
+        print(f"❌ Run failed: {', '.join(problems)}")
+        sys.exit(1)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"💾 Saved to {args.save}")
+    if baseline:
+        worse = regressions(result, baseline, args.tolerance)
+        if worse:
+            print(f"❌ Regression in: {', '.join(worse)}")
+            sys.exit(1)
+        print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
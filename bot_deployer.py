@@ -4,93 +4,90 @@ AUTO-DEPLOY BOTS TO RAILWAY
 """
 
 import os
-import requests
-import json
-import time
-from datetime import datetime
+import asyncio
+
+from railway_client import RailwayClient
 
 class RailwayDeployer:
-    def __init__(self):
-        self.railway_token = os.getenv("RAILWAY_TOKEN")
+    def __init__(self, client=None):
         self.project_id = os.getenv("RAILWAY_PROJECT_ID")
-        self.headers = {
-            "Authorization": f"Bearer {self.railway_token}",
-            "Content-Type": "application/json"
-        }
-    
-    def create_environment(self, user_id, bot_token):
-        """Create environment for user bot"""
-        env_name = f"BOT_{user_id}"
-        
-        payload = {
+        self.environment_id = os.getenv("RAILWAY_ENVIRONMENT_ID")
+        self.client = client or RailwayClient()
+
+    async def close(self):
+        await self.client.close()
+
+    def _variable_input(self, user_id, bot_token):
+        return {
             "projectId": self.project_id,
-            "name": env_name,
+            "name": f"BOT_{user_id}",
             "value": bot_token
         }
-        
-        response = requests.post(
-            "https://backboard.railway.app/graphql/v2",
-            json={
-                "query": """
-                    mutation UpsertVariable($input: VariableUpsertInput!) {
-                        variableUpsert(input: $input) {
-                            id
-                            name
-                            value
-                        }
-                    }
-                """,
-                "variables": {"input": payload}
-            },
-            headers=self.headers
-        )
-        
-        return response.json()
-    
-    def deploy_bot(self, user_id, bot_name):
-        """Deploy a new bot service"""
+
+    def _service_input(self, user_id, bot_name, requirements_hash=None, find_links=None):
         service_name = f"{bot_name}-{user_id}".lower().replace(" ", "-")
-        
-        payload = {
-            "query": """
-                mutation ServiceInstanceCreate($input: ServiceInstanceCreateInput!) {
-                    serviceInstanceCreate(input: $input) {
-                        id
-                        name
-                        createdAt
-                    }
-                }
-            """,
-            "variables": {
-                "input": {
-                    "projectId": self.project_id,
-                    "name": service_name,
-                    "source": {
-                        "image": "python:3.11"
-                    },
-                    "variables": [
-                        {"name": "BOT_TOKEN", "value": f"${{BOT_{user_id}}}"},
-                        {"name": "OWNER_ID", "value": str(user_id)}
-                    ]
-                }
-            }
+        variables = [
+            {"name": "BOT_TOKEN", "value": f"${{BOT_{user_id}}}"},
+            {"name": "OWNER_ID", "value": str(user_id)}
+        ]
+        # Lets pip install from the prebuilt wheelhouse for this requirements set
+        if requirements_hash:
+            variables.append({"name": "REQUIREMENTS_HASH", "value": requirements_hash})
+        if find_links:
+            variables.append({"name": "PIP_FIND_LINKS", "value": find_links})
+        return {
+            "projectId": self.project_id,
+            "name": service_name,
+            "source": {
+                "image": "python:3.11"
+            },
+            "variables": variables
         }
-        
-        response = requests.post(
-            "https://backboard.railway.app/graphql/v2",
-            json=payload,
-            headers=self.headers
+
+    async def create_environment(self, user_id, bot_token):
+        """Create environment for user bot"""
+        return await self.client.upsert_variable(self.project_id, f"BOT_{user_id}", bot_token)
+
+    async def deploy_bot(self, user_id, bot_name):
+        """Deploy a new bot service"""
+        return await self.client.create_service(self._service_input(user_id, bot_name))
+
+    async def deploy(self, user_id, bot_name, bot_token, requirements_hash=None, find_links=None, reuse_existing=False):
+        """Store the token and create the service in one API round-trip.
+
+        reuse_existing is for retried jobs: the earlier attempt may have
+        created the service even though its response never arrived.
+        """
+        service_input = self._service_input(user_id, bot_name, requirements_hash, find_links)
+        if reuse_existing:
+            existing = await self.client.find_service(self.project_id, service_input["name"])
+            if existing is not None:
+                variable = await self.client.upsert_variable(self.project_id, f"BOT_{user_id}", bot_token)
+                return {"variableUpsert": variable, "serviceInstanceCreate": existing}
+        return await self.client.upsert_variable_and_create_service(
+            self._variable_input(user_id, bot_token),
+            service_input
         )
-        
-        return response.json()
+
+    async def stop(self, service_id):
+        """Remove a bot's service"""
+        return await self.client.delete_service(service_id)
+
+    async def restart(self, service_id):
+        """Redeploy a bot's service in place"""
+        if not self.environment_id:
+            raise ValueError("RAILWAY_ENVIRONMENT_ID is not set")
+        return await self.client.redeploy_service(self.environment_id, service_id)
 
 # Example usage
 if __name__ == "__main__":
-    deployer = RailwayDeployer()
-    
-    # Test deployment
-    result = deployer.create_environment(123456, "test_token_here")
-    print("Environment created:", result)
-    
-    result = deployer.deploy_bot(123456, "MyBot")
-    print("Deployment started:", result)
\ No newline at end of file
+    async def example():
+        deployer = RailwayDeployer()
+        try:
+            # Test deployment
+            result = await deployer.deploy(123456, "MyBot", "test_token_here")
+            print("Deployment started:", result)
+        finally:
+            await deployer.close()
+
+    asyncio.run(example())
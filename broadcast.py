@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+ADMIN BROADCAST ENGINE
+Sends one message to every user within Telegram's flood limits
+
+Status flow: queued -> running -> done | cancelled
+"""
+
+import os
+import time
+import asyncio
+import logging
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import Forbidden, RetryAfter, TelegramError
+
+from rate_limit import KeyedLimiter, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Serializes claims across replicas (see Broadcaster.claim)
+BROADCAST_LOCK_ID = 7_971_284_842
+
+
+class Broadcaster:
+    """Streams recipients page by page and sends through token buckets.
+
+    Recipients are read in user_id order with keyset pagination, and the
+    last finished user_id is stored after every page, so a restarted process
+    resumes where the previous one stopped (re-sending at most one page).
+    A claimed broadcast is leased like a deployment job, and nothing is
+    claimed while another broadcast holds a live lease: BROADCAST_RATE is
+    the bot's limit, so only one broadcast sends at a time cluster-wide.
+    """
+
+    def __init__(self, db, bot=None, rate=None, per_chat_rate=None, page_size=None, report_interval=None,
+                 lease=None, max_retries=5):
+        self.db = db
+        self.bot = bot
+        self.limiter = TokenBucket(float(rate or os.getenv("BROADCAST_RATE", 25)))
+        self.chats = KeyedLimiter(float(per_chat_rate or os.getenv("BROADCAST_PER_CHAT_RATE", 1)))
+        self.page_size = int(page_size or os.getenv("BROADCAST_PAGE_SIZE", 200))
+        self.report_interval = float(report_interval or os.getenv("BROADCAST_REPORT_INTERVAL", 5))
+        self.lease = int(lease or os.getenv("BROADCAST_LEASE_SECONDS", 120))
+        self.max_retries = max_retries
+        self._task = None
+        self._wakeup = asyncio.Event()
+
+    # ==================== CONTROL ====================
+
+    async def create(self, text, admin_chat_id, message_id):
+        """Queue a broadcast; progress is reported by editing message_id"""
+        row = await self.db.fetchone("""
+            INSERT INTO broadcasts (text, admin_chat_id, message_id, total)
+            SELECT %s, %s, %s, COUNT(*) FROM users
+            RETURNING id, total
+        """, (text, admin_chat_id, message_id))
+        self._wakeup.set()
+        return row
+
+    async def cancel(self, broadcast_id):
+        count = await self.db.execute("""
+            UPDATE broadcasts SET status = 'cancelled', finished_at = NOW()
+            WHERE id = %s AND status IN ('queued', 'running')
+        """, (broadcast_id,))
+        return count > 0
+
+    async def claim(self):
+        """Lease the oldest unfinished broadcast, or None while one is being sent"""
+        def fn(cur):
+            # Without the lock two replicas could each claim a different broadcast
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (BROADCAST_LOCK_ID,))
+            cur.execute("""
+                SELECT 1 FROM broadcasts
+                WHERE status = 'running' AND locked_until >= NOW()
+                LIMIT 1
+            """)
+            if cur.fetchone():
+                return None
+            cur.execute("""
+                SELECT id FROM broadcasts
+                WHERE status IN ('queued', 'running')
+                  AND (locked_until IS NULL OR locked_until < NOW())
+                ORDER BY id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            """)
+            row = cur.fetchone()
+            if row is None:
+                return None
+            cur.execute("""
+                UPDATE broadcasts
+                SET status = 'running', started_at = COALESCE(started_at, NOW()),
+                    locked_until = NOW() + %s * INTERVAL '1 second'
+                WHERE id = %s
+                RETURNING *
+            """, (self.lease, row['id']))
+            return cur.fetchone()
+        return await self.db.run(fn)
+
+    # ==================== SENDING ====================
+
+    async def send(self, chat_id, text):
+        """Deliver one message, returns 'sent', 'blocked' or 'failed'"""
+        for _ in range(self.max_retries):
+            await self.chats.acquire(chat_id)
+            await self.limiter.acquire()
+            try:
+                await self.bot.send_message(chat_id, text)
+                return 'sent'
+            except RetryAfter as e:
+                # Flood control applies to the whole bot, so every sender backs off
+                logger.warning(f"Broadcast hit flood control, pausing {e.retry_after}s")
+                self.limiter.pause(float(e.retry_after))
+            except Forbidden:
+                return 'blocked'
+            except TelegramError as e:
+                logger.debug(f"Broadcast to {chat_id} failed: {e}")
+                return 'failed'
+        return 'failed'
+
+    async def _report(self, job, sent, failed, blocked, rate, final=False):
+        done = sent + failed + blocked
+        total = max(job['total'], done)
+        if final:
+            header = "✅ Broadcast finished" if job['status'] != 'cancelled' else "🛑 Broadcast cancelled"
+        else:
+            header = "📢 Broadcasting..."
+        lines = [
+            f"{header} #{job['id']}",
+            "",
+            f"Progress: {done}/{total} ({done / total:.0%})" if total else f"Progress: {done}",
+            f"✅ Sent: {sent}   ❌ Failed: {failed}   🚫 Blocked: {blocked}",
+            f"⚡ {rate:.1f} msg/s"
+        ]
+        if not final and rate > 0 and total > done:
+            lines.append(f"⏳ ETA: {(total - done) / rate / 60:.1f} min")
+        try:
+            await self.bot.edit_message_text(
+                "\n".join(lines), chat_id=job['admin_chat_id'], message_id=job['message_id'],
+                reply_markup=None if final else self.stop_markup(job['id'])
+            )
+        except TelegramError as e:
+            logger.debug(f"Broadcast #{job['id']} progress update failed: {e}")
+
+    @staticmethod
+    def stop_markup(broadcast_id):
+        return InlineKeyboardMarkup([[InlineKeyboardButton("🛑 Stop", callback_data=f"bcast_stop:{broadcast_id}")]])
+
+    async def process(self, job):
+        """Send a claimed broadcast to everyone after its last finished user"""
+        sent, failed, blocked = job['sent'], job['failed'], job['blocked']
+        last_user_id = job['last_user_id']
+        started = time.monotonic()
+        started_done = sent + failed + blocked
+        reported = 0.0
+
+        while True:
+            rows = await self.db.fetchall("""
+                SELECT user_id FROM users WHERE user_id > %s ORDER BY user_id LIMIT %s
+            """, (last_user_id, self.page_size))
+            if not rows:
+                break
+
+            results = await asyncio.gather(*(self.send(r['user_id'], job['text']) for r in rows))
+            page = {'sent': 0, 'failed': 0, 'blocked': 0}
+            for result in results:
+                page[result] += 1
+            sent, failed, blocked = sent + page['sent'], failed + page['failed'], blocked + page['blocked']
+            last_user_id = rows[-1]['user_id']
+
+            row = await self.db.fetchone("""
+                UPDATE broadcasts
+                SET last_user_id = %s, sent = %s, failed = %s, blocked = %s,
+                    locked_until = NOW() + %s * INTERVAL '1 second'
+                WHERE id = %s
+                RETURNING status
+            """, (last_user_id, sent, failed, blocked, self.lease, job['id']))
+            if row is None or row['status'] == 'cancelled':
+                job = {**job, 'status': 'cancelled'}
+                break
+
+            now = time.monotonic()
+            if now - reported >= self.report_interval:
+                reported = now
+                rate = (sent + failed + blocked - started_done) / max(now - started, 1e-6)
+                await self._report(job, sent, failed, blocked, rate)
+
+        if job['status'] != 'cancelled':
+            await self.db.execute("""
+                UPDATE broadcasts SET status = 'done', locked_until = NULL, finished_at = NOW()
+                WHERE id = %s AND status = 'running'
+            """, (job['id'],))
+        rate = (sent + failed + blocked - started_done) / max(time.monotonic() - started, 1e-6)
+        logger.info(f"Broadcast #{job['id']} {job['status']}: {sent} sent, {failed} failed, {blocked} blocked")
+        await self._report(job, sent, failed, blocked, rate, final=True)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                job = await self.claim()
+                if job is not None:
+                    await self.process(job)
+                    continue
+            except Exception as e:
+                logger.error(f"Broadcast failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.lease)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
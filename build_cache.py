@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+DEPENDENCY BUILD CACHE
+Prebuilt wheelhouses keyed by the hash of a normalized requirements set
+"""
+
+import os
+import re
+import sys
+import time
+import shutil
+import asyncio
+import hashlib
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+_NAME = r"[A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?"
+_VERSION = r"(?:~=|===|==|!=|<=|>=|<|>)\s*[A-Za-z0-9.*+!_-]+"
+_MARKER_TERM = (
+    r"(?:python_version|python_full_version|os_name|sys_platform|platform_system|platform_machine"
+    r"|platform_release|platform_python_implementation|implementation_name)"
+    r"\s*(?:<=|>=|==|!=|~=|<|>|not\s+in|in)\s*(?:'[^'\"]*'|\"[^'\"]*\")"
+)
+_MARKER = rf"{_MARKER_TERM}(?:\s+(?:and|or)\s+{_MARKER_TERM})*"
+
+# Only "name[extras] specifiers ; marker": no options (-r, -e, --index-url),
+# URLs, direct references (name @ url) or paths, since pip would fetch them
+REQUIREMENT_RE = re.compile(
+    rf"^({_NAME})\s*(\[\s*{_NAME}(?:\s*,\s*{_NAME})*\s*\])?\s*"
+    rf"({_VERSION}(?:\s*,\s*{_VERSION})*)?\s*(?:;\s*({_MARKER}))?$"
+)
+
+# Variables the pip subprocess may see; everything else (DATABASE_URL,
+# RAILWAY_TOKEN, BOT_TOKEN...) stays out of its environment
+BUILD_ENV_PASSTHROUGH = ("HTTP_PROXY", "HTTPS_PROXY", "NO_PROXY", "http_proxy", "https_proxy", "no_proxy")
+
+
+class BuildError(Exception):
+    """pip could not build the requirements set"""
+
+
+class InvalidRequirements(BuildError):
+    """requirements.txt has a line we refuse to hand to pip"""
+
+
+def normalize_requirements(text):
+    """Canonical, sorted requirement lines so equivalent files hash alike.
+
+    Raises InvalidRequirements for anything but plain requirement lines.
+    """
+    lines = set()
+    for number, raw in enumerate(text.splitlines(), 1):
+        line = raw.split(" #", 1)[0].strip()
+        if not line or line.startswith("#"):
+            continue
+        match = REQUIREMENT_RE.match(line)
+        if match is None:
+            raise InvalidRequirements(f"Line {number} is not allowed: {line[:60]!r}")
+        name, extras, spec, marker = match.groups()
+        name = re.sub(r"[-_.]+", "-", name).lower()
+        if extras:
+            extras = "[" + ",".join(sorted(e.strip().lower() for e in extras[1:-1].split(","))) + "]"
+        line = name + (extras or "") + re.sub(r"\s+", "", spec or "")
+        if marker and marker.strip():
+            line += "; " + marker.strip()
+        lines.add(line)
+    return sorted(lines)
+
+
+def requirements_hash(lines):
+    return hashlib.sha256("\n".join(lines).encode()).hexdigest()
+
+
+class BuildCache:
+    """Builds each distinct requirements set once with `pip wheel`.
+
+    Wheelhouses live under BUILD_CACHE_DIR/<hash>; deploys sharing a hash
+    reuse them and only pay for the install, not the build.
+
+    Requirements come from users, so pip only downloads prebuilt wheels
+    (--only-binary=:all:, no setup.py ever runs on this host) from
+    BUILD_INDEX_URL, ignores pip config (--isolated) and gets an
+    environment without any of the manager's secrets.
+    """
+
+    def __init__(self, db, uploads, root=None, timeout=None, python=None):
+        self.db = db
+        self.uploads = uploads
+        self.root = root or os.getenv("BUILD_CACHE_DIR", "build_cache")
+        self.timeout = float(timeout or os.getenv("BUILD_TIMEOUT", 600))
+        self.python = python or sys.executable
+        self.index_url = os.getenv("BUILD_INDEX_URL", "https://pypi.org/simple")
+        self.base_url = os.getenv("BUILD_CACHE_URL", "")
+        self._building = {}
+        self.hits = 0
+        self.misses = 0
+        self.build_seconds = 0.0
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.root, key)
+
+    def find_links(self, key):
+        """URL hosted services can hand to pip --find-links, if one is served"""
+        return f"{self.base_url.rstrip('/')}/{key}/" if self.base_url else None
+
+    @staticmethod
+    def _build_env(workdir):
+        env = {"PATH": os.defpath, "HOME": workdir, "LANG": "C.UTF-8"}
+        for name in BUILD_ENV_PASSTHROUGH:
+            if name in os.environ:
+                env[name] = os.environ[name]
+        return env
+
+    async def _build(self, key, lines):
+        workdir = tempfile.mkdtemp(dir=self.root, prefix=f".{key[:12]}-")
+        requirements = os.path.join(workdir, "requirements.txt")
+        with open(requirements, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+        process = await asyncio.create_subprocess_exec(
+            self.python, "-m", "pip", "wheel", "--quiet", "--isolated", "--no-input",
+            "--disable-pip-version-check", "--no-cache-dir", "--only-binary=:all:",
+            "--index-url", self.index_url,
+            "--wheel-dir", os.path.join(workdir, "wheels"),
+            "-r", requirements,
+            cwd=workdir,
+            env=self._build_env(workdir),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT
+        )
+        try:
+            output, _ = await asyncio.wait_for(process.communicate(), self.timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise BuildError(f"pip wheel timed out after {self.timeout:.0f}s")
+        if process.returncode != 0:
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise BuildError(output.decode(errors="replace")[-500:])
+
+        os.replace(os.path.join(workdir, "wheels"), self.path_for(key))
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    async def ensure(self, requirements_text):
+        """Make sure a wheelhouse exists, returns (hash, cache hit, seconds)"""
+        lines = normalize_requirements(requirements_text)
+        key = requirements_hash(lines)
+        started = time.monotonic()
+
+        if os.path.isdir(self.path_for(key)):
+            self.hits += 1
+            hit = True
+        else:
+            # Concurrent deploys of the same set wait on one build
+            build = self._building.get(key)
+            if build is None:
+                build = asyncio.ensure_future(self._build(key, lines))
+                self._building[key] = build
+                build.add_done_callback(lambda _: self._building.pop(key, None))
+                self.misses += 1
+                hit = False
+            else:
+                self.hits += 1
+                hit = True
+            await asyncio.shield(build)
+
+        seconds = time.monotonic() - started
+        if not hit:
+            self.build_seconds += seconds
+        await self.db.execute("""
+            INSERT INTO build_cache (requirements_hash, requirements, build_seconds, hits, last_used_at)
+            VALUES (%s, %s, %s, %s, NOW())
+            ON CONFLICT (requirements_hash) DO UPDATE
+            SET hits = build_cache.hits + EXCLUDED.hits, last_used_at = NOW()
+        """, (key, "\n".join(lines), seconds if not hit else None, 1 if hit else 0))
+        return key, hit, seconds
+
+    async def ensure_for_deployment(self, deployment_id):
+        """Build cache step of a deploy; records hit and timing on the row"""
+        row = await self.db.fetchone("""
+            SELECT sha256 FROM deployment_files
+            WHERE deployment_id = %s AND file_name = 'requirements.txt'
+        """, (deployment_id,))
+        if row is None:
+            return None
+        with open(self.uploads.path_for(row['sha256']), encoding="utf-8", errors="replace") as f:
+            text = f.read()
+
+        key, hit, seconds = await self.ensure(text)
+        await self.db.execute("""
+            UPDATE deployments
+            SET requirements_hash = %s, build_cache_hit = %s, build_seconds = %s
+            WHERE id = %s
+        """, (key, hit, seconds, deployment_id))
+        logger.info(f"Deployment {deployment_id}: requirements {key[:12]} {'hit' if hit else 'built'} in {seconds:.1f}s")
+        return key
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'avg_build_seconds': self.build_seconds / self.misses if self.misses else 0.0
+        }
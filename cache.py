@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+IN-PROCESS LRU / TTL CACHE
+"""
+
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after ttl seconds.
+
+    For read-through use, take generation(key) before the fetch and pass it
+    to set(): if the key was invalidated while the fetch ran, the fetched
+    (now stale) value is not cached.
+    """
+
+    def __init__(self, maxsize=10000, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._generations = OrderedDict()
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires = entry
+        if expires <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def generation(self, key):
+        return (self._epoch, self._generations.get(key, 0))
+
+    def set(self, key, value, generation=None):
+        """Store value, unless key was invalidated since generation was taken"""
+        if generation is not None and generation != self.generation(key):
+            return False
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+        self._generations[key] = self._generations.pop(key, 0) + 1
+        if len(self._generations) > self.maxsize:
+            self._generations.popitem(last=False)
+            # A forgotten generation could match an old token again
+            self._epoch += 1
+
+    def clear(self):
+        self._data.clear()
+        self._epoch += 1
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and entry[1] > time.monotonic()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Hit/miss counters for dashboards and logs"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
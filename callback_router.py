@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+CALLBACK QUERY ROUTER
+Dispatches button presses on "<action>" or "<action>:<payload>" data
+"""
+
+import time
+import logging
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_ROUTE = "<unknown>"
+
+
+class CallbackRouter:
+    """Registry of callback routes with O(1) dispatch and per-route metrics.
+
+    Route handlers are called as handler(update, context, payload) where
+    payload is the parsed part after the separator, or None.
+    """
+
+    def __init__(self, separator=":", not_found_text="⏳ Coming soon!"):
+        self.separator = separator
+        self.not_found_text = not_found_text
+        self.routes = {}
+        self.metrics = defaultdict(lambda: {
+            'calls': 0,
+            'errors': 0,
+            'total_time': 0.0,
+            'max_time': 0.0
+        })
+
+    def add(self, action, handler, parse=None):
+        """Register handler for action; parse converts the payload string"""
+        if action in self.routes:
+            raise ValueError(f"Callback route already registered: {action}")
+        self.routes[action] = (handler, parse)
+
+    def route(self, action, parse=None):
+        """Decorator form of add()"""
+        def decorator(handler):
+            self.add(action, handler, parse)
+            return handler
+        return decorator
+
+    def split(self, data):
+        """Split callback data into (action, raw payload)"""
+        action, sep, payload = (data or "").partition(self.separator)
+        return action, payload if sep else None
+
+    async def dispatch(self, update, context):
+        """CallbackQueryHandler callback - answer and run the matching route"""
+        query = update.callback_query
+        action, raw = self.split(query.data)
+        entry = self.routes.get(action)
+
+        if entry is None:
+            self.metrics[UNKNOWN_ROUTE]['calls'] += 1
+            await query.answer(self.not_found_text)
+            return
+
+        handler, parse = entry
+        metrics = self.metrics[action]
+        metrics['calls'] += 1
+
+        payload = raw
+        if raw is not None and parse is not None:
+            try:
+                payload = parse(raw)
+            except (TypeError, ValueError):
+                metrics['errors'] += 1
+                await query.answer("⚠️ Invalid button")
+                return
+
+        await query.answer()
+        started = time.perf_counter()
+        try:
+            await handler(update, context, payload)
+        except Exception:
+            metrics['errors'] += 1
+            logger.exception(f"Callback route {action!r} failed")
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics['total_time'] += elapsed
+            metrics['max_time'] = max(metrics['max_time'], elapsed)
+
+    def stats(self):
+        """Per-route calls, errors and latency"""
+        return {
+            action: {
+                **m,
+                'avg_time': m['total_time'] / m['calls'] if m['calls'] else 0.0
+            }
+            for action, m in self.metrics.items()
+        }
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+CLUSTERED SCALE-OUT
+Webhook ingress sharded by user_id across manager replicas, with cache
+invalidation between replicas over Postgres LISTEN/NOTIFY
+
+    ingress:  python cluster.py            (receives Telegram's webhook)
+    stats:    curl -H "X-Telegram-Bot-Api-Secret-Token: $CLUSTER_SECRET" <ingress>/cluster
+    worker i: BOT_MODE=webhook CLUSTER_SHARD=i CLUSTER_SHARDS=N python main_bot.py
+"""
+
+import os
+import json
+import hmac
+import asyncio
+import secrets
+import logging
+
+import httpx
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, TypeHandler
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_CHANNEL = "cluster_events"
+
+# Runs right after the update type guard (-100), before flood control (-90)
+SHARD_GUARD_GROUP = -95
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+
+def update_user_id(data):
+    """User an update belongs to, from its raw JSON (0 when there is none)"""
+    for key, value in data.items():
+        if not isinstance(value, dict):
+            continue
+        user = value.get("from") or value.get("user")
+        if isinstance(user, dict) and "id" in user:
+            return int(user["id"])
+        chat = value.get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return abs(int(chat["id"]))
+    return 0
+
+
+def shard_for(user_id, shards):
+    return user_id % shards
+
+
+def install_shard_guard(application, shard=None, shards=None):
+    """Drop updates that belong to another worker's shard.
+
+    The ingress never misroutes, but a worker reachable by mistake (or
+    during a resize) must not double-process another shard's users.
+    """
+    shards = int(shards or os.getenv("CLUSTER_SHARDS", 1))
+    if shards <= 1:
+        return
+    shard = int(shard if shard is not None else os.getenv("CLUSTER_SHARD", 0))
+
+    async def guard(update, context):
+        user = update.effective_user
+        if user is not None and shard_for(user.id, shards) != shard:
+            logger.warning(f"Dropped update {update.update_id} for shard {shard_for(user.id, shards)}")
+            raise ApplicationHandlerStop
+
+    application.add_handler(TypeHandler(Update, guard), group=SHARD_GUARD_GROUP)
+    logger.info(f"Cluster worker for shard {shard}/{shards}")
+
+
+def per_replica(rate, shards=None):
+    """Share of a bot-wide rate for one of the replicas sending at once"""
+    shards = max(1, int(shards or os.getenv("CLUSTER_SHARDS", 1)))
+    return rate / shards
+
+
+# ==================== INGRESS ====================
+
+class IngressRouter:
+    """Forwards each webhook body to the worker that owns its user.
+
+    All updates of one user go to one worker, so per-user state (flood
+    buckets, the user cache, the write buffer) never needs sharing.
+    Worker errors are passed back as 503 and Telegram redelivers.
+    """
+
+    def __init__(self, workers=None, secret_token=None, worker_secret=None, timeout=None):
+        self.workers = workers or [u.strip() for u in os.getenv("CLUSTER_WORKERS", "").split(",") if u.strip()]
+        if not self.workers:
+            raise ValueError("CLUSTER_WORKERS is empty")
+        # Registered with Telegram by __main__, so a random one works when unset
+        self.secret_token = secret_token or os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+        self.worker_secret = worker_secret or os.getenv("CLUSTER_SECRET")
+        if not self.worker_secret:
+            raise ValueError("CLUSTER_SECRET is required, workers reject updates without it")
+        self.http = httpx.AsyncClient(
+            timeout=httpx.Timeout(float(timeout or os.getenv("CLUSTER_FORWARD_TIMEOUT", 10)), connect=2.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=100)
+        )
+        self.forwarded = [0] * len(self.workers)
+        self.failed = [0] * len(self.workers)
+
+    async def close(self):
+        await self.http.aclose()
+
+    async def handle(self, method, headers, body):
+        if method != "POST":
+            return 405, b"", "text/plain"
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, ""), self.secret_token):
+            return 403, b"", "text/plain"
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return 400, b"", "text/plain"
+
+        shard = shard_for(update_user_id(data), len(self.workers))
+        try:
+            response = await self.http.post(
+                self.workers[shard],
+                content=body,
+                headers={"Content-Type": "application/json", SECRET_HEADER: self.worker_secret}
+            )
+        except httpx.HTTPError as e:
+            self.failed[shard] += 1
+            logger.warning(f"Worker {shard} unreachable: {e}")
+            return 503, b"", "text/plain"
+        self.forwarded[shard] += 1
+        return response.status_code, b"", "text/plain"
+
+    async def stats_route(self, method, headers, body):
+        """Per-worker counters; served on the public port, so CLUSTER_SECRET is required"""
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, ""), self.worker_secret):
+            return 403, b"", "text/plain"
+        stats = [
+            {'worker': url, 'forwarded': sent, 'failed': failed}
+            for url, sent, failed in zip(self.workers, self.forwarded, self.failed)
+        ]
+        return 200, json.dumps(stats).encode(), "application/json"
+
+
+# ==================== LISTEN / NOTIFY ====================
+
+def notify_users_changed(cur, user_ids):
+    """Tell every replica these users' cached rows are stale (sent on commit)"""
+    if user_ids:
+        cur.execute(
+            "SELECT pg_notify(%s, 'user:' || id) FROM unnest(%s::bigint[]) AS id",
+            (CLUSTER_CHANNEL, list(user_ids))
+        )
+
+
+class ClusterBus:
+    """LISTEN on a dedicated connection and dispatch "kind:payload" events.
+
+    Notifications sent while the connection was down are lost, so
+    on_reconnect callbacks get to drop whatever they cached.
+    """
+
+    def __init__(self, dsn=None, channel=CLUSTER_CHANNEL):
+        self.dsn = dsn or os.getenv("DATABASE_URL")
+        self.channel = channel
+        self.handlers = {}
+        self.reconnect_handlers = []
+        self.received = 0
+        self._conn = None
+        self._task = None
+
+    def subscribe(self, kind, handler):
+        self.handlers.setdefault(kind, []).append(handler)
+
+    def on_reconnect(self, handler):
+        self.reconnect_handlers.append(handler)
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {self.channel}")
+        return conn
+
+    def _dispatch(self):
+        while self._conn.notifies:
+            notify = self._conn.notifies.pop(0)
+            self.received += 1
+            kind, _, payload = notify.payload.partition(":")
+            for handler in self.handlers.get(kind, ()):
+                try:
+                    handler(payload)
+                except Exception as e:
+                    logger.error(f"Cluster event {kind} handler failed: {e}")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        delay = 1.0
+        first = True
+        while True:
+            try:
+                self._conn = await loop.run_in_executor(None, self._connect)
+            except psycopg2.Error as e:
+                logger.warning(f"Cluster bus connect failed, retrying in {delay:.0f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+                continue
+            delay = 1.0
+            if not first:
+                for handler in self.reconnect_handlers:
+                    handler()
+            first = False
+
+            lost = asyncio.Event()
+
+            def readable():
+                try:
+                    self._conn.poll()
+                    self._dispatch()
+                except psycopg2.Error as e:
+                    logger.warning(f"Cluster bus connection lost: {e}")
+                    lost.set()
+
+            loop.add_reader(self._conn.fileno(), readable)
+            try:
+                await lost.wait()
+            finally:
+                loop.remove_reader(self._conn.fileno())
+                self._conn.close()
+                self._conn = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def attach_user_cache(bus, db):
+    """Keep db.user_cache coherent with writes made by other replicas"""
+    bus.subscribe("user", lambda payload: db.user_cache.invalidate(int(payload)))
+    bus.on_reconnect(db.user_cache.clear)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from telegram import Bot
+    from webhook import HTTPServer, health_route, wait_for_stop_signal
+
+    load_dotenv()
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+
+    async def run():
+        router = IngressRouter()
+        token = os.getenv("BOT_TOKEN")
+        path = os.getenv("WEBHOOK_PATH") or f"/bot/{token.split(':')[0]}"
+        server = HTTPServer()
+        server.add_route(path, router.handle)
+        server.add_route("/healthz", health_route)
+        server.add_route("/cluster", router.stats_route)
+        await server.start()
+
+        url = os.getenv("WEBHOOK_URL", "")
+        if url:
+            allowed = os.getenv("CLUSTER_ALLOWED_UPDATES")
+            async with Bot(token) as bot:
+                await bot.set_webhook(
+                    url.rstrip("/") + path,
+                    allowed_updates=allowed.split(",") if allowed else None,
+                    secret_token=router.secret_token,
+                    max_connections=int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))
+                )
+        print(f"🔀 Ingress forwarding {path} to {len(router.workers)} workers")
+        try:
+            await wait_for_stop_signal()
+        finally:
+            await server.stop()
+            await router.close()
+
+    asyncio.run(run())
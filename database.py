@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+"""
+ASYNC POOLED DATABASE LAYER
+Shared by the hosting manager and its background services
+"""
+
+import os
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+from cache import TTLCache
+from cluster import notify_users_changed
+from migrations import migrate
+
+logger = logging.getLogger(__name__)
+
+# Advisory lock key so only one replica rebuilds referral counters at a time
+RECONCILE_LOCK_ID = 7_971_284_842
+
+# Set inside the warm-up task, whose own queries must not wait for it
+_warming_up = ContextVar('warming_up', default=False)
+
+# Column values a freshly inserted user row gets from the table defaults
+USER_DEFAULTS = {
+    'status': 'active',
+    'plan': 'trial',
+    'plan_type': 'trial',
+    'trial_start': None,
+    'bot_expiry': None,
+    'bot_active': False,
+    'premium_status': False
+}
+
+
+class UserWriteBuffer:
+    """Write-behind buffer for user upserts.
+
+    Pending rows are merged by user_id and written with one multi-row
+    INSERT ... ON CONFLICT every flush_ms milliseconds or max_rows rows.
+    """
+
+    def __init__(self, db, flush_ms=None, max_rows=None):
+        self.db = db
+        self.flush_interval = int(flush_ms or os.getenv("DB_WRITE_FLUSH_MS", 200)) / 1000
+        self.max_rows = int(max_rows or os.getenv("DB_WRITE_BATCH_ROWS", 500))
+        self._pending = {}
+        self._queued_at = {}
+        # Rows handed to the database but not committed yet
+        self._flushing = {}
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.metrics = {
+            'flushes': 0,
+            'rows_written': 0,
+            'flush_errors': 0,
+            'last_flush_lag': 0.0,
+            'max_flush_lag': 0.0,
+            'last_flush_duration': 0.0
+        }
+
+    def add(self, user_id, username, first_name, last_name=None, trial_end=None):
+        """Queue an upsert, merging with anything already pending for user_id"""
+        row = self._pending.get(user_id)
+        if row is None:
+            self._pending[user_id] = {
+                'user_id': user_id,
+                'username': username,
+                'first_name': first_name,
+                'last_name': last_name,
+                'trial_end': trial_end or datetime.now() + timedelta(days=3)
+            }
+            self._queued_at[user_id] = time.monotonic()
+        else:
+            # Mirror ON CONFLICT: only the username is refreshed
+            row['username'] = username
+        if len(self._pending) >= self.max_rows:
+            self._wakeup.set()
+        return self._pending[user_id]
+
+    def pending(self, user_id):
+        """Row still waiting to be written for user_id, if any"""
+        return self._pending.get(user_id) or self._flushing.get(user_id)
+
+    async def flush_if_pending(self, user_id):
+        """Write the buffer now if user_id has an unwritten row.
+
+        A row in _flushing is not committed yet either: flush() waits on the
+        lock for that flush to finish (and retries it if it failed).
+        """
+        if user_id in self._pending or user_id in self._flushing:
+            await self.flush()
+
+    async def flush(self):
+        """Write every pending row in one statement"""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            rows, queued_at = self._pending, self._queued_at
+            self._pending, self._queued_at = {}, {}
+            self._flushing = rows
+
+            started = time.monotonic()
+            values = [
+                (r['user_id'], r['username'], r['first_name'], r['last_name'], r['trial_end'])
+                for r in rows.values()
+            ]
+
+            def fn(cur):
+                execute_values(cur, """
+                    INSERT INTO users (user_id, username, first_name, last_name, trial_end)
+                    VALUES %s
+                    ON CONFLICT (user_id) DO UPDATE
+                    SET username = EXCLUDED.username
+                """, values, page_size=len(values))
+
+            try:
+                await self.db.run(fn)
+            except Exception as e:
+                self.metrics['flush_errors'] += 1
+                logger.error(f"User write flush failed ({len(rows)} rows): {e}")
+                # Put rows back without clobbering anything queued meanwhile
+                for user_id, row in rows.items():
+                    if user_id not in self._pending:
+                        self._pending[user_id] = row
+                        self._queued_at[user_id] = queued_at[user_id]
+                raise
+            finally:
+                self._flushing = {}
+
+            for user_id in rows:
+                self.db.user_cache.invalidate(user_id)
+
+            done = time.monotonic()
+            lag = done - min(queued_at.values())
+            self.metrics['flushes'] += 1
+            self.metrics['rows_written'] += len(rows)
+            self.metrics['last_flush_lag'] = lag
+            self.metrics['max_flush_lag'] = max(self.metrics['max_flush_lag'], lag)
+            self.metrics['last_flush_duration'] = done - started
+            return len(rows)
+
+    def stats(self):
+        """Flush counters plus the age of the oldest pending row"""
+        oldest = min(self._queued_at.values(), default=None)
+        return {
+            **self.metrics,
+            'pending_rows': len(self._pending),
+            'pending_lag': time.monotonic() - oldest if oldest is not None else 0.0
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write whatever is left"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+class Database:
+    """Async facade over a psycopg2 connection pool.
+
+    Every query runs on a pooled connection inside a worker thread, so a slow
+    round-trip only occupies one pool slot instead of the whole event loop.
+    """
+
+    def __init__(self, dsn=None, min_size=None, max_size=None, query_timeout=None, retries=2):
+        self.dsn = dsn or os.getenv("DATABASE_URL")
+        self.min_size = int(min_size or os.getenv("DB_POOL_MIN", 1))
+        self.max_size = int(max_size or os.getenv("DB_POOL_MAX", 10))
+        self.query_timeout = float(query_timeout or os.getenv("DB_QUERY_TIMEOUT", 5))
+        self.retries = retries
+        self.pool = None
+        self.ready = None
+        self._migrate_retry = None
+        self._pool_lock = threading.Lock()
+        # One worker per pooled connection: getconn() can never run dry
+        self._executor = ThreadPoolExecutor(max_workers=self.max_size, thread_name_prefix="db")
+        self.user_writes = UserWriteBuffer(self)
+        self.user_cache = TTLCache(
+            maxsize=int(os.getenv("USER_CACHE_SIZE", 10000)),
+            ttl=float(os.getenv("USER_CACHE_TTL", 30))
+        )
+
+    # ==================== POOL ====================
+
+    async def connect(self):
+        """Open the pool and bring the schema up to date in the background.
+
+        Returns at once so polling/webhook setup overlaps the connect; the
+        first query waits for the warm-up instead (see run).
+        """
+        self.user_writes.start()
+        if self.ready is None:
+            self.ready = asyncio.create_task(self._warm_up())
+        return self.ready
+
+    async def _warm_up(self):
+        _warming_up.set(True)
+        try:
+            await migrate(self)
+            print("✅ Database Connected")
+        except Exception as e:
+            # Queries go ahead (and fail until Postgres is back), but the
+            # schema must still be brought up to date once it is
+            print(f"⚠️ Database Warning: {e}")
+            self._migrate_retry = asyncio.create_task(self._retry_migrate())
+
+    async def _retry_migrate(self, delay=1.0):
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await migrate(self)
+            except Exception as e:
+                delay = min(delay * 2, 60.0)
+                logger.warning(f"Schema migration failed, retrying in {delay:.0f}s: {e}")
+                continue
+            print("✅ Database Connected")
+            return
+
+    async def close(self):
+        """Flush pending writes and close every pooled connection"""
+        for task in (self.ready, self._migrate_retry):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        try:
+            await self.user_writes.stop()
+        except Exception as e:
+            logger.error(f"Unflushed user writes dropped: {e}")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close_pool)
+        self._executor.shutdown(wait=False)
+
+    def _open_pool(self):
+        with self._pool_lock:
+            if self.pool is None or self.pool.closed:
+                self.pool = ThreadedConnectionPool(
+                    self.min_size,
+                    self.max_size,
+                    self.dsn,
+                    cursor_factory=RealDictCursor,
+                    connect_timeout=max(1, int(self.query_timeout)),
+                    options=f"-c statement_timeout={int(self.query_timeout * 1000)}"
+                )
+        return self.pool
+
+    def _close_pool(self):
+        with self._pool_lock:
+            if self.pool is not None and not self.pool.closed:
+                self.pool.closeall()
+            self.pool = None
+
+    def _transaction(self, fn):
+        """Run fn(cur) in one transaction, retrying on a dropped connection"""
+        for attempt in range(self.retries + 1):
+            pool = self._open_pool()
+            conn = pool.getconn()
+            try:
+                with conn.cursor() as cur:
+                    result = fn(cur)
+                conn.commit()
+                return result
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                # Timeouts also land here; only a dead connection is retried
+                if not conn.closed:
+                    conn.rollback()
+                    raise
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Database connection lost, reconnecting: {e}")
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                pool.putconn(conn, close=bool(conn.closed))
+
+    async def run(self, fn):
+        """Run fn(cur) in a transaction without blocking the event loop"""
+        if self.ready is not None and not self.ready.done() and not _warming_up.get():
+            await asyncio.shield(self.ready)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._transaction, fn)
+
+    # ==================== QUERY HELPERS ====================
+
+    @staticmethod
+    def _execute(cur, query, params, timeout):
+        if timeout is not None:
+            cur.execute("SET LOCAL statement_timeout = %s", (int(timeout * 1000),))
+        cur.execute(query, params)
+
+    async def fetchone(self, query, params=None, timeout=None):
+        def fn(cur):
+            self._execute(cur, query, params, timeout)
+            return cur.fetchone()
+        return await self.run(fn)
+
+    async def fetchall(self, query, params=None, timeout=None):
+        def fn(cur):
+            self._execute(cur, query, params, timeout)
+            return cur.fetchall()
+        return await self.run(fn)
+
+    async def execute(self, query, params=None, timeout=None):
+        def fn(cur):
+            self._execute(cur, query, params, timeout)
+            return cur.rowcount
+        return await self.run(fn)
+
+    # ==================== USERS ====================
+
+    async def get_user(self, user_id):
+        """Get user by ID, including writes still in the buffer"""
+        user = self.user_cache.get(user_id)
+        if user is None:
+            generation = self.user_cache.generation(user_id)
+            user = await self.fetchone("SELECT * FROM users WHERE user_id = %s", (user_id,))
+            # Misses are not cached: a new user is about to be created. A row
+            # invalidated while the SELECT ran is returned but not cached
+            if user is not None:
+                self.user_cache.set(user_id, user, generation)
+        pending = self.user_writes.pending(user_id)
+        if pending is None:
+            return user
+        if user is None:
+            return {**USER_DEFAULTS, **pending}
+        return {**user, 'username': pending['username']}
+
+    async def create_user(self, user_data):
+        """Register a new user"""
+        row = self.user_writes.add(
+            user_data['id'],
+            user_data['username'],
+            user_data['first_name'],
+            user_data.get('last_name')
+        )
+        return {**USER_DEFAULTS, **row}
+
+    async def start_trial(self, user_id, trial_start, trial_end):
+        """Start the trial and bot runtime"""
+        await self.user_writes.flush_if_pending(user_id)
+        def fn(cur):
+            cur.execute("""
+                UPDATE users
+                SET trial_start = %s, trial_end = %s, bot_expiry = %s, expiry_stage = 0
+                WHERE user_id = %s
+            """, (trial_start, trial_end, trial_end, user_id))
+            notify_users_changed(cur, [user_id])
+        await self.run(fn)
+        self.user_cache.invalidate(user_id)
+
+    # ==================== DEPLOYMENTS ====================
+
+    async def attach_upload(self, user_id, file_name, sha256, size, required_files):
+        """Record an uploaded file on the user's draft deployment.
+
+        Returns (deployment_id, files_uploaded, has_token); the deploy queue
+        only picks up deployments that have both.
+        """
+        def fn(cur):
+            # Both files often arrive at once: serialize per user
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (user_id,))
+            cur.execute("""
+                SELECT id FROM deployments
+                WHERE user_id = %s AND status = 'pending' AND NOT files_uploaded
+                ORDER BY id DESC
+                LIMIT 1
+            """, (user_id,))
+            row = cur.fetchone()
+            if row is None:
+                cur.execute("""
+                    INSERT INTO deployments (user_id, bot_name)
+                    VALUES (%s, %s)
+                    RETURNING id
+                """, (user_id, f"bot-{user_id}"))
+                row = cur.fetchone()
+            deployment_id = row['id']
+
+            cur.execute("""
+                INSERT INTO deployment_files (deployment_id, file_name, sha256, size)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (deployment_id, file_name) DO UPDATE
+                SET sha256 = EXCLUDED.sha256, size = EXCLUDED.size, uploaded_at = NOW()
+            """, (deployment_id, file_name, sha256, size))
+
+            cur.execute("""
+                UPDATE deployments SET files_uploaded = TRUE, updated_at = NOW()
+                WHERE id = %s AND (
+                    SELECT COUNT(*) FROM deployment_files
+                    WHERE deployment_id = %s AND file_name = ANY(%s)
+                ) = %s
+                RETURNING bot_token IS NOT NULL AS has_token
+            """, (deployment_id, deployment_id, list(required_files), len(required_files)))
+            row = cur.fetchone()
+            return deployment_id, row is not None, bool(row and row['has_token'])
+        return await self.run(fn)
+
+    # ==================== REFERRALS ====================
+
+    async def add_referral(self, referrer_id, referred_id):
+        """Add referral and give bonus, returns whether the bonus was granted"""
+        # Duplicate check, insert, counter bump and bonus in one statement;
+        # the unique index makes concurrent signups with one link race-free
+        try:
+            await self.user_writes.flush_if_pending(referrer_id)
+            def fn(cur):
+                cur.execute("""
+                    WITH inserted AS (
+                        INSERT INTO referrals (referrer_id, referred_id, bonus_given)
+                        VALUES (%(referrer_id)s, %(referred_id)s, TRUE)
+                        ON CONFLICT (referrer_id, referred_id) DO NOTHING
+                        RETURNING referrer_id
+                    ), counted AS (
+                        INSERT INTO referral_counts (referrer_id, total)
+                        SELECT referrer_id, 1 FROM inserted
+                        ON CONFLICT (referrer_id) DO UPDATE
+                        SET total = referral_counts.total + 1, updated_at = NOW()
+                    ), bonus AS (
+                        UPDATE users
+                        SET bot_expiry = bot_expiry + INTERVAL '2 hours'
+                        WHERE user_id IN (SELECT referrer_id FROM inserted)
+                        RETURNING user_id
+                    )
+                    SELECT EXISTS (SELECT 1 FROM bonus) AS granted
+                """, {'referrer_id': referrer_id, 'referred_id': referred_id})
+                granted = cur.fetchone()['granted']
+                if granted:
+                    # The referrer's row may be cached by another replica
+                    notify_users_changed(cur, [referrer_id])
+                return granted
+            granted = await self.run(fn)
+            if granted:
+                self.user_cache.invalidate(referrer_id)
+            return granted
+        except Exception as e:
+            logger.error(f"Referral error: {e}")
+            return False
+
+    async def count_referrals(self, referrer_id):
+        """Number of users brought in by referrer_id"""
+        row = await self.fetchone("""
+            SELECT total FROM referral_counts
+            WHERE referrer_id = %s
+        """, (referrer_id,))
+        return row['total'] if row else 0
+
+    async def reconcile_referral_counts(self):
+        """Rebuild referral_counts from referrals, returns rows corrected (None if already running)"""
+        def fn(cur):
+            cur.execute("SELECT pg_try_advisory_xact_lock(%s) AS locked", (RECONCILE_LOCK_ID,))
+            if not cur.fetchone()['locked']:
+                return None
+            cur.execute("""
+                WITH actual AS (
+                    SELECT referrer_id, COUNT(*) AS total FROM referrals
+                    WHERE referrer_id IS NOT NULL
+                    GROUP BY referrer_id
+                )
+                INSERT INTO referral_counts (referrer_id, total)
+                SELECT referrer_id, total FROM actual
+                ON CONFLICT (referrer_id) DO UPDATE
+                SET total = EXCLUDED.total, updated_at = NOW()
+                WHERE referral_counts.total <> EXCLUDED.total
+            """)
+            fixed = cur.rowcount
+            cur.execute("""
+                UPDATE referral_counts rc SET total = 0, updated_at = NOW()
+                WHERE rc.total <> 0
+                  AND NOT EXISTS (SELECT 1 FROM referrals r WHERE r.referrer_id = rc.referrer_id)
+            """)
+            return fixed + cur.rowcount
+        return await self.run(fn)
+
+    # ==================== ADMIN ====================
+
+    async def admin_stats(self):
+        """Counters shown on the admin panel, computed in one pass"""
+        return await self.fetchone("""
+            SELECT
+                COUNT(*) AS total_users,
+                COUNT(*) FILTER (WHERE trial_end > NOW()) AS active_trials,
+                COUNT(*) FILTER (WHERE premium_status = TRUE) AS premium_users,
+                (SELECT COALESCE(SUM(total), 0) FROM referral_counts) AS total_refs
+            FROM users
+        """)
+
+    async def bot_health(self, limit=10):
+        """Running bots per probe state and the worst offenders, from the last probes"""
+        def fn(cur):
+            cur.execute("""
+                SELECT COALESCE(health, 'unprobed') AS health, COUNT(*) AS bots,
+                       AVG(probe_latency_ms) AS avg_latency_ms
+                FROM deployments
+                WHERE status = 'running'
+                GROUP BY 1
+            """)
+            summary = {row['health']: row for row in cur.fetchall()}
+            cur.execute("""
+                SELECT id, user_id, bot_name, health, health_detail, probe_failures
+                FROM deployments
+                WHERE status = 'running' AND health IS NOT NULL AND health <> 'healthy'
+                ORDER BY probe_failures DESC, last_probe_at DESC
+                LIMIT %s
+            """, (limit,))
+            return summary, cur.fetchall()
+        return await self.run(fn)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+DEPLOYMENT JOB QUEUE
+Durable queue on the deployments table drained by a pool of async workers
+
+Status flow: pending -> deploying -> running | failed | cancelled
+"""
+
+import os
+import asyncio
+import logging
+
+from build_cache import BuildError, InvalidRequirements
+
+logger = logging.getLogger(__name__)
+
+
+class DeploymentQueue:
+    """Claims deployments with FOR UPDATE SKIP LOCKED and deploys them.
+
+    A claimed row is leased until locked_until; if a worker dies mid-deploy
+    the lease runs out and another worker picks the job up again. A live
+    worker keeps renewing it, so a slow build is never claimed twice.
+    """
+
+    def __init__(self, db, deployer, build_cache=None, notify=None, workers=None, max_attempts=None,
+                 lease=None, poll_interval=None):
+        self.db = db
+        self.deployer = deployer
+        self.build_cache = build_cache
+        self.notify = notify
+        self.workers = int(workers if workers is not None else os.getenv("DEPLOY_WORKERS", 3))
+        self.max_attempts = int(max_attempts or os.getenv("DEPLOY_MAX_ATTEMPTS", 3))
+        self.lease = int(lease or os.getenv("DEPLOY_LEASE_SECONDS", 600))
+        self.poll_interval = float(poll_interval or os.getenv("DEPLOY_POLL_INTERVAL", 2))
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+
+    # ==================== PRODUCERS ====================
+
+    async def cancel(self, deployment_id, user_id):
+        """Ask for a deployment to be cancelled"""
+        count = await self.db.execute("""
+            UPDATE deployments SET cancel_requested = TRUE, updated_at = NOW()
+            WHERE id = %s AND user_id = %s AND status IN ('pending', 'deploying')
+        """, (deployment_id, user_id))
+        # A pending job is settled by the next claim
+        self.wake()
+        return count > 0
+
+    def wake(self):
+        """Let idle workers look for a job right away"""
+        self._wakeup.set()
+
+    # ==================== WORKERS ====================
+
+    async def claim(self):
+        """Lease the next ready job, or None"""
+        def fn(cur):
+            # Settle cancellations nobody is working on
+            cur.execute("""
+                UPDATE deployments SET status = 'cancelled', locked_until = NULL, updated_at = NOW()
+                WHERE status IN ('pending', 'deploying') AND cancel_requested
+                  AND (status = 'pending' OR locked_until < NOW())
+            """)
+            cur.execute("""
+                SELECT id FROM deployments
+                WHERE files_uploaded AND bot_token IS NOT NULL AND NOT cancel_requested
+                  AND status IN ('pending', 'deploying')
+                  AND (locked_until IS NULL OR locked_until < NOW())
+                ORDER BY id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            """)
+            row = cur.fetchone()
+            if row is None:
+                return None
+            cur.execute("""
+                UPDATE deployments
+                SET status = 'deploying', attempts = attempts + 1, updated_at = NOW(),
+                    locked_until = NOW() + %s * INTERVAL '1 second'
+                WHERE id = %s
+                RETURNING *
+            """, (self.lease, row['id']))
+            return cur.fetchone()
+        return await self.db.run(fn)
+
+    async def _finish(self, job, status, error=None, service_id=None):
+        await self.db.execute("""
+            UPDATE deployments
+            SET status = %s, last_error = %s, service_id = COALESCE(%s, service_id),
+                locked_until = NULL, updated_at = NOW()
+            WHERE id = %s
+        """, (status, error, service_id, job['id']))
+        if self.notify is not None:
+            try:
+                await self.notify(job, status, error)
+            except Exception as e:
+                logger.error(f"Deployment {job['id']} notification failed: {e}")
+
+    async def _retry_later(self, job, error):
+        delay = min(30 * 2 ** (job['attempts'] - 1), 900)
+        await self.db.execute("""
+            UPDATE deployments
+            SET status = 'pending', last_error = %s, updated_at = NOW(),
+                locked_until = NOW() + %s * INTERVAL '1 second'
+            WHERE id = %s
+        """, (error, delay, job['id']))
+
+    async def _keep_leased(self, job):
+        """Push locked_until forward while the job is being worked on"""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await self.db.execute("""
+                    UPDATE deployments SET locked_until = NOW() + %s * INTERVAL '1 second'
+                    WHERE id = %s AND status = 'deploying'
+                """, (self.lease, job['id']))
+            except Exception as e:
+                logger.warning(f"Deployment {job['id']} lease renewal failed: {e}")
+
+    async def _is_cancelled(self, job):
+        row = await self.db.fetchone("SELECT cancel_requested FROM deployments WHERE id = %s", (job['id'],))
+        return row is None or row['cancel_requested']
+
+    async def _cached_requirements(self, job):
+        """Wheelhouse hash for the job, or None to deploy without the cache"""
+        try:
+            return await self.build_cache.ensure_for_deployment(job['id'])
+        except InvalidRequirements:
+            raise
+        except BuildError as e:
+            # sdist-only packages or an index outage: the service's own pip may still manage
+            logger.warning(f"Deployment {job['id']} deploying uncached, build failed: {str(e)[-200:]}")
+            await self.db.execute("""
+                UPDATE deployments SET requirements_hash = NULL, build_cache_hit = FALSE
+                WHERE id = %s
+            """, (job['id'],))
+            return None
+
+    async def process(self, job):
+        """Deploy one claimed job and record the outcome"""
+        if job['cancel_requested'] or await self._is_cancelled(job):
+            await self._finish(job, 'cancelled')
+            return
+
+        heartbeat = asyncio.create_task(self._keep_leased(job))
+        try:
+            service_id = None
+            if job['hosting'] != 'shared':
+                requirements_hash = None
+                if self.build_cache is not None:
+                    requirements_hash = await self._cached_requirements(job)
+                result = await self.deployer.deploy(
+                    job['user_id'], job['bot_name'], job['bot_token'],
+                    requirements_hash=requirements_hash,
+                    find_links=self.build_cache.find_links(requirements_hash) if requirements_hash else None,
+                    reuse_existing=job['attempts'] > 1
+                )
+                service_id = (result.get('serviceInstanceCreate') or {}).get('id')
+        except InvalidRequirements as e:
+            # Retrying can't fix the file
+            await self._finish(job, 'failed', str(e))
+            return
+        except Exception as e:
+            logger.error(f"Deployment {job['id']} attempt {job['attempts']} failed: {e}")
+            if job['attempts'] < self.max_attempts:
+                await self._retry_later(job, str(e))
+            else:
+                await self._finish(job, 'failed', str(e))
+            return
+        finally:
+            heartbeat.cancel()
+
+        # Cancelled while the deploy call was in flight: remove what it created
+        if await self._is_cancelled(job):
+            error = None
+            if service_id:
+                try:
+                    await self.deployer.stop(service_id)
+                except Exception as e:
+                    logger.error(f"Deployment {job['id']} cancelled but service {service_id} not removed: {e}")
+                    error = f"Service {service_id} still running: {e}"
+            await self._finish(job, 'cancelled', error, service_id=service_id)
+            return
+        await self._finish(job, 'running', service_id=service_id)
+
+    async def _worker(self, number):
+        while True:
+            try:
+                job = await self.claim()
+            except Exception as e:
+                logger.error(f"Deploy worker {number} claim failed: {e}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.process(job)
+            except Exception as e:
+                logger.error(f"Deploy worker {number} failed on job {job['id']}: {e}")
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from database import Database
+    from bot_deployer import RailwayDeployer
+    from build_cache import BuildCache
+    from uploads import UploadStore
+    from webhook import wait_for_stop_signal
+
+    load_dotenv()
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+
+    async def run():
+        db = Database()
+        await db.connect()
+        deployer = RailwayDeployer()
+        uploads = UploadStore()
+        queue = DeploymentQueue(db, deployer, BuildCache(db, uploads))
+        queue.start()
+        print(f"🚀 Deploy workers started ({queue.workers})")
+        try:
+            await wait_for_stop_signal()
+        finally:
+            await queue.stop()
+            await deployer.close()
+            await uploads.close()
+            await db.close()
+
+    asyncio.run(run())
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+BOT EXPIRY SCHEDULER
+Warns users before their bot runtime ends and stops the bot when it does
+
+Stage flow on users.expiry_stage: 0 (nothing sent) -> 1 (warned) -> 2 (expired)
+"""
+
+import os
+import asyncio
+import logging
+
+from cluster import notify_users_changed, per_replica
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiryScheduler:
+    """Sleeps until the next expiry event instead of rescanning users.
+
+    The next due time comes from the (expiry_stage, bot_expiry) index, so
+    each wake-up reads only the rows that are actually due. Rows are claimed
+    with SKIP LOCKED and moved to their next stage in the same statement, so
+    several replicas never send the same warning twice.
+    """
+
+    def __init__(self, db, bot=None, deployer=None, warn_before=None, batch_size=None, max_sleep=None,
+                 send_rate=None):
+        self.db = db
+        self.bot = bot
+        self.deployer = deployer
+        self.warn_before = int(warn_before or os.getenv("EXPIRY_WARN_BEFORE", 6 * 3600))
+        self.batch_size = int(batch_size or os.getenv("EXPIRY_BATCH_SIZE", 500))
+        self.max_sleep = float(max_sleep or os.getenv("EXPIRY_MAX_SLEEP", 300))
+        # Every replica runs a scheduler, so each gets its share of the bot's limit
+        self.send_rate = max(1, int(per_replica(int(send_rate or os.getenv("EXPIRY_SEND_RATE", 25)))))
+        self.warned = 0
+        self.expired = 0
+        self._task = None
+        self._wakeup = asyncio.Event()
+
+    def wake(self):
+        """Re-plan now, e.g. after an expiry was moved earlier"""
+        self._wakeup.set()
+
+    # ==================== QUERIES ====================
+
+    async def next_due(self):
+        """Seconds until the next warning or expiry, None when nothing is scheduled"""
+        row = await self.db.fetchone("""
+            SELECT EXTRACT(EPOCH FROM LEAST(
+                (SELECT bot_expiry - %s * INTERVAL '1 second' FROM users
+                 WHERE expiry_stage = 0 AND bot_expiry IS NOT NULL
+                 ORDER BY bot_expiry LIMIT 1),
+                (SELECT bot_expiry FROM users
+                 WHERE expiry_stage = 1 AND bot_expiry IS NOT NULL
+                 ORDER BY bot_expiry LIMIT 1)
+            ) - NOW()) AS seconds
+        """, (self.warn_before,))
+        if row is None or row['seconds'] is None:
+            return None
+        return max(float(row['seconds']), 0.0)
+
+    async def claim_expired(self):
+        """Mark a batch of expired users and their bots, returns the stopped rows"""
+        def fn(cur):
+            cur.execute("""
+                UPDATE users SET expiry_stage = 2, bot_active = FALSE
+                WHERE user_id IN (
+                    SELECT user_id FROM users
+                    WHERE expiry_stage < 2 AND bot_expiry <= NOW()
+                    ORDER BY bot_expiry
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING user_id
+            """, (self.batch_size,))
+            user_ids = [r['user_id'] for r in cur.fetchall()]
+            if not user_ids:
+                return [], []
+            notify_users_changed(cur, user_ids)
+            # Queued deploys are cancelled, live bots are marked for stopping
+            cur.execute("""
+                UPDATE deployments SET cancel_requested = TRUE, updated_at = NOW()
+                WHERE user_id = ANY(%s) AND status IN ('pending', 'deploying')
+            """, (user_ids,))
+            cur.execute("""
+                UPDATE deployments SET status = 'expired', updated_at = NOW()
+                WHERE user_id = ANY(%s) AND status = 'running'
+                RETURNING id, user_id, hosting, service_id
+            """, (user_ids,))
+            return user_ids, cur.fetchall()
+        return await self.db.run(fn)
+
+    async def claim_warnings(self):
+        """Mark a batch of users entering the warning window, returns (user_id, bot_expiry) rows"""
+        return await self.db.fetchall("""
+            UPDATE users SET expiry_stage = 1
+            WHERE user_id IN (
+                SELECT user_id FROM users
+                WHERE expiry_stage = 0
+                  AND bot_expiry > NOW()
+                  AND bot_expiry <= NOW() + %s * INTERVAL '1 second'
+                ORDER BY bot_expiry
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING user_id, bot_expiry
+        """, (self.warn_before, self.batch_size))
+
+    # ==================== ACTIONS ====================
+
+    async def _send_all(self, messages):
+        """Send (chat_id, text) pairs in paced batches"""
+        if self.bot is None:
+            return
+        for i in range(0, len(messages), self.send_rate):
+            batch = messages[i:i + self.send_rate]
+            results = await asyncio.gather(
+                *(self.bot.send_message(chat_id, text, parse_mode='Markdown') for chat_id, text in batch),
+                return_exceptions=True
+            )
+            for (chat_id, _), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"Expiry notice to {chat_id} failed: {result}")
+            if i + self.send_rate < len(messages):
+                await asyncio.sleep(1)
+
+    async def _stop_services(self, deployments):
+        if self.deployer is None:
+            return
+        for row in deployments:
+            # Shared tenants are dropped by the runner's next sync
+            if row['hosting'] == 'shared' or not row['service_id']:
+                continue
+            try:
+                await self.deployer.stop(row['service_id'])
+            except Exception as e:
+                logger.error(f"Stopping expired deployment {row['id']} failed: {e}")
+
+    async def run_due(self):
+        """Handle every event that is due now, batch by batch"""
+        while True:
+            user_ids, deployments = await self.claim_expired()
+            if not user_ids:
+                break
+            for user_id in user_ids:
+                self.db.user_cache.invalidate(user_id)
+            self.expired += len(user_ids)
+            await self._stop_services(deployments)
+            await self._send_all([
+                (user_id, "🔴 *Your bot has expired.*\n\nUpgrade with /premium to bring it back online.")
+                for user_id in user_ids
+            ])
+
+        while True:
+            rows = await self.claim_warnings()
+            if not rows:
+                break
+            self.warned += len(rows)
+            await self._send_all([
+                (row['user_id'], "⏰ *Your bot expires soon!*\n\n"
+                                 f"Runtime ends {row['bot_expiry'].strftime('%d/%m/%Y %H:%M')}.\n"
+                                 "Use /premium to extend it or /referral to earn free hours.")
+                for row in rows
+            ])
+
+    async def _run(self):
+        while True:
+            delay = self.max_sleep
+            self._wakeup.clear()
+            try:
+                await self.run_due()
+                due = await self.next_due()
+                if due is not None:
+                    delay = min(due, self.max_sleep)
+            except Exception as e:
+                logger.error(f"Expiry scheduler failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        return {'warned': self.warned, 'expired': self.expired}
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
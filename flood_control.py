@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+PER-USER FLOOD CONTROL
+Rate limits and de-duplicates updates before any handler runs
+"""
+
+import os
+import logging
+
+from telegram import Update
+from telegram.error import BadRequest
+from telegram.ext import ApplicationHandlerStop, TypeHandler
+
+from cache import TTLCache
+from rate_limit import KeyedLimiter
+
+logger = logging.getLogger(__name__)
+
+# Runs after the update type guard (-100) and before every real handler
+FLOOD_CONTROL_GROUP = -90
+
+
+class FloodControl:
+    """Token bucket per user plus a short window for duplicate updates.
+
+    A second press of the same button (or the same command text) inside
+    coalesce_window is answered and dropped; a user over their budget is
+    told to slow down once per window and their updates are dropped until
+    the bucket refills. edit() skips edits that would not change the message.
+    """
+
+    def __init__(self, rate=None, burst=None, coalesce_window=None, exempt=(), max_users=50000):
+        self.users = KeyedLimiter(
+            float(rate or os.getenv("FLOOD_RATE", 1)),
+            float(burst or os.getenv("FLOOD_BURST", 5)),
+            max_keys=max_users
+        )
+        window = float(coalesce_window or os.getenv("FLOOD_COALESCE_WINDOW", 2))
+        self.recent = TTLCache(maxsize=max_users, ttl=window)
+        self.warned = TTLCache(maxsize=max_users, ttl=window * 5)
+        self.exempt = set(exempt)
+        self.metrics = {'passed': 0, 'coalesced': 0, 'limited': 0, 'unchanged_edits': 0}
+
+    @staticmethod
+    def fingerprint(update):
+        """What makes two updates from one user duplicates of each other"""
+        if update.callback_query is not None:
+            message = update.callback_query.message
+            return ('callback', update.callback_query.data, message.message_id if message else None)
+        if update.message is not None and update.message.text:
+            return ('text', update.message.text)
+        return None
+
+    async def check(self, update, context):
+        """TypeHandler callback - stop the update here if it is a flood"""
+        user = update.effective_user
+        if user is None or user.id in self.exempt:
+            return
+        query = update.callback_query
+
+        key = self.fingerprint(update)
+        if key is not None:
+            if (user.id, key) in self.recent:
+                self.metrics['coalesced'] += 1
+                if query is not None:
+                    await query.answer()
+                raise ApplicationHandlerStop
+            self.recent.set((user.id, key), True)
+
+        if not self.users.try_acquire(user.id):
+            self.metrics['limited'] += 1
+            if query is not None:
+                await query.answer("⏳ Slow down a little!")
+            elif user.id not in self.warned and update.effective_message is not None:
+                self.warned.set(user.id, True)
+                await update.effective_message.reply_text("⏳ Too many requests, please wait a moment.")
+            raise ApplicationHandlerStop
+
+        self.metrics['passed'] += 1
+
+    def install(self, application, group=FLOOD_CONTROL_GROUP):
+        application.add_handler(TypeHandler(Update, self.check), group=group)
+
+    @staticmethod
+    def _shows(message, text, reply_markup, parse_mode=None):
+        """Whether message already displays text with reply_markup"""
+        if message is None or message.text is None or message.reply_markup != reply_markup:
+            return False
+        render = {
+            None: lambda: message.text,
+            'markdown': lambda: message.text_markdown,
+            'markdownv2': lambda: message.text_markdown_v2,
+            'html': lambda: message.text_html
+        }.get(parse_mode.lower() if parse_mode else None)
+        try:
+            return render is not None and render() == text
+        except ValueError:
+            # Entities legacy Markdown can't express
+            return False
+
+    async def edit(self, query, text, reply_markup=None, **kwargs):
+        """edit_message_text, returns False if the message already showed this.
+
+        Compared against the message the button was pressed on (its state
+        right now), so an unchanged refresh costs no API call. When the
+        rendering differs only in formatting, Telegram's "message is not
+        modified" still catches it.
+        """
+        if self._shows(query.message, text, reply_markup, kwargs.get('parse_mode')):
+            self.metrics['unchanged_edits'] += 1
+            return False
+        try:
+            await query.edit_message_text(text=text, reply_markup=reply_markup, **kwargs)
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+            self.metrics['unchanged_edits'] += 1
+            return False
+        return True
+
+    def stats(self):
+        return {**self.metrics, 'tracked_users': len(self.users)}
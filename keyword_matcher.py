@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+KEYWORD AUTO-REPLY MATCHER
+Aho-Corasick automaton compiled once per keyword set, matched in one pass
+"""
+
+import os
+import json
+import time
+import logging
+from collections import deque, namedtuple
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+Rule = namedtuple("Rule", "keyword reply priority whole_word")
+
+# Used when an owner has not configured any keywords
+DEFAULT_RULES = [
+    Rule("hello", "👋 Hello! How can I help you?", 0, False),
+    Rule("hi", "👋 Hi there!", 0, False),
+    Rule("price", "💰 Check /premium for pricing", 0, False),
+    Rule("help", "🆘 Need help? Contact @CyperXploit", 0, False),
+    Rule("bot", "🤖 I'm a premium bot hosted on Railway!", 0, False),
+    Rule("time", "⏰ Current time: {time}", 0, False)
+]
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+class KeywordMatcher:
+    """Immutable automaton over a list of Rules.
+
+    The winning rule is the one with the highest priority; ties go to the
+    rule listed first, like the old dict scan.
+    """
+
+    def __init__(self, rules):
+        self.rules = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for rule in rules:
+            keyword = rule.keyword.lower()
+            if not keyword:
+                continue
+            node = 0
+            for ch in keyword:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][ch] = nxt
+                node = nxt
+            self._out[node].append(len(self.rules))
+            self.rules.append(rule._replace(keyword=keyword))
+
+        # Breadth-first failure links; outputs inherit their fallback's
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self, text):
+        """Best matching Rule for text, or None"""
+        text = text.lower()
+        goto, fail, out, rules = self._goto, self._fail, self._out, self.rules
+        best = None
+        node = 0
+        for end, ch in enumerate(text, 1):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for index in out[node]:
+                rule = rules[index]
+                if rule.whole_word:
+                    start = end - len(rule.keyword)
+                    if start > 0 and _is_word_char(text[start - 1]):
+                        continue
+                    if end < len(text) and _is_word_char(text[end]):
+                        continue
+                if best is None or rule.priority > rules[best].priority or (
+                        rule.priority == rules[best].priority and index < best):
+                    best = index
+        return rules[best] if best is not None else None
+
+    def reply_for(self, text):
+        """Rendered reply for text, or None"""
+        rule = self.match(text)
+        if rule is None:
+            return None
+        if "{time}" in rule.reply:
+            return rule.reply.replace("{time}", datetime.now().strftime('%H:%M:%S'))
+        return rule.reply
+
+
+def _to_rules(items):
+    return [
+        Rule(
+            item['keyword'],
+            item['reply'],
+            int(item.get('priority') or 0),
+            bool(item.get('whole_word'))
+        )
+        for item in items
+    ]
+
+
+def file_loader(path):
+    """Loader reading a JSON list of {keyword, reply, priority, whole_word}"""
+    async def load():
+        if not path or not os.path.exists(path):
+            return DEFAULT_RULES
+        with open(path, encoding="utf-8") as f:
+            return _to_rules(json.load(f)) or DEFAULT_RULES
+    return load
+
+
+def db_loader(db, owner_id):
+    """Loader reading one owner's rows from bot_keywords"""
+    async def load():
+        rows = await db.fetchall("""
+            SELECT keyword, reply, priority, whole_word FROM bot_keywords
+            WHERE owner_id = %s
+            ORDER BY id
+        """, (owner_id,))
+        return _to_rules(rows) or DEFAULT_RULES
+    return load
+
+
+class KeywordSet:
+    """Hot-reloadable matcher for one owner.
+
+    The loader is polled at most every reload_interval seconds and the
+    automaton is only rebuilt when the rules actually changed.
+    """
+
+    def __init__(self, loader, reload_interval=None):
+        self.loader = loader
+        self.reload_interval = float(reload_interval or os.getenv("KEYWORDS_RELOAD_INTERVAL", 30))
+        self.matcher = None
+        self._rules = None
+        self._loaded_at = 0.0
+
+    async def reload(self):
+        """Fetch rules now and swap in a new automaton if they changed"""
+        self._loaded_at = time.monotonic()
+        rules = list(await self.loader())
+        if rules != self._rules:
+            self.matcher = KeywordMatcher(rules)
+            self._rules = rules
+            logger.info(f"Compiled {len(self.matcher)} keywords")
+        return self.matcher
+
+    async def get(self):
+        if self.matcher is None or time.monotonic() - self._loaded_at >= self.reload_interval:
+            try:
+                await self.reload()
+            except Exception as e:
+                if self.matcher is None:
+                    raise
+                # Keep serving the previous automaton
+                logger.error(f"Keyword reload failed: {e}")
+        return self.matcher
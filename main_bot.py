@@ -9,8 +9,12 @@ import sys
 import logging
 import asyncio
 from datetime import datetime, timedelta
+
+# First, so the telegram/httpx/psycopg2 imports below count as start-up time
+from startup import STARTUP
+
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler, filters
 
 # ==================== CONFIGURATION ====================
 from dotenv import load_dotenv
@@ -21,6 +25,14 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 ADMIN_ID = 7971284841
 ADMIN_USERNAME = "@CyperXploit"
 
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+# httpx logs every request URL at INFO, and probe URLs carry hosted bots' tokens
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
 # CRITICAL CHECK
 if not BOT_TOKEN:
     print("❌ ERROR: BOT_TOKEN not found in Railway Variables!")
@@ -28,168 +40,49 @@ if not BOT_TOKEN:
     sys.exit(1)
 
 # ==================== DATABASE SETUP ====================
-import psycopg2
-from psycopg2.extras import RealDictCursor
-
-class DatabaseManager:
-    def __init__(self):
-        self.conn = None
-        self.connect()
-    
-    def connect(self):
-        try:
-            self.conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
-            self.init_tables()
-            print("✅ Database Connected")
-        except Exception as e:
-            print(f"⚠️ Database Warning: {e}")
-    
-    def init_tables(self):
-        try:
-            with self.conn.cursor() as cur:
-                # Users table
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        user_id BIGINT PRIMARY KEY,
-                        username VARCHAR(100),
-                        first_name VARCHAR(100),
-                        status VARCHAR(20) DEFAULT 'active',
-                        trial_end TIMESTAMP,
-                        plan VARCHAR(20) DEFAULT 'trial',
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                # Deployments table
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS deployments (
-                        id SERIAL PRIMARY KEY,
-                        user_id BIGINT,
-                        bot_name VARCHAR(100),
-                        status VARCHAR(20) DEFAULT 'pending',
-                        files_uploaded BOOLEAN DEFAULT FALSE,
-                        bot_token VARCHAR(200),
-                        railway_url VARCHAR(500),
-                        cancel_requested BOOLEAN DEFAULT FALSE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                # Referrals table
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS referrals (
-                        id SERIAL PRIMARY KEY,
-                        referrer_id BIGINT,
-                        referred_id BIGINT,
-                        bonus_given BOOLEAN DEFAULT FALSE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                self.conn.commit()
-        except Exception as e:
-            print(f"⚠️ Table Error: {e}")
-
-db = DatabaseManager()
+from database import Database
+from admin_stats import AdminStatsSnapshot
+from callback_router import CallbackRouter
+from webhook import bounded_update_queue, restrict_update_types, run_application
+from bot_deployer import RailwayDeployer
+from deploy_queue import DeploymentQueue
+from uploads import REQUIRED_FILES, UploadStore, UploadTooLarge
+from build_cache import BuildCache, InvalidRequirements, normalize_requirements
+from expiry_scheduler import ExpiryScheduler
+from broadcast import Broadcaster
+from supervisor import BotSupervisor
+from flood_control import FloodControl
+from templates import TemplateRegistry
+from cluster import ClusterBus, attach_user_cache, install_shard_guard
+from metrics import REGISTRY, InstrumentedRequest, instrument_application, instrument_methods, start_metrics_server
+
+db = Database(DATABASE_URL)
+admin_stats = AdminStatsSnapshot(db)
+router = CallbackRouter()
+deployer = RailwayDeployer()
+uploads = UploadStore()
+build_cache = BuildCache(db, uploads)
+deploy_queue = DeploymentQueue(db, deployer, build_cache)
+expiry = ExpiryScheduler(db, deployer=deployer)
+broadcaster = Broadcaster(db)
+supervisor = BotSupervisor(db, deployer=deployer)
+cluster_bus = ClusterBus(DATABASE_URL)
+attach_user_cache(cluster_bus, db)
+flood_control = FloodControl(exempt={ADMIN_ID})
+templates = TemplateRegistry({'admin_username': ADMIN_USERNAME, 'admin_id': ADMIN_ID})
+
+instrument_methods(db)
+REGISTRY.gauge_callback("bot_user_cache_hit_ratio", "User cache hit ratio", lambda: db.user_cache.stats()['hit_rate'])
+REGISTRY.gauge_callback("bot_user_writes_pending", "Buffered user rows not yet written", lambda: db.user_writes.stats()['pending_rows'])
+REGISTRY.gauge_callback("bot_flood_limited", "Updates dropped by per-user rate limits", lambda: flood_control.metrics['limited'])
+REGISTRY.gauge_callback("bot_flood_coalesced", "Duplicate updates dropped", lambda: flood_control.metrics['coalesced'])
+REGISTRY.gauge_callback("bot_health_probes", "Hosted bot health probes sent", lambda: supervisor.probes)
+REGISTRY.gauge_callback("bot_health_restarts", "Hosted bots restarted after failed probes", lambda: supervisor.restarts)
+REGISTRY.gauge_callback("bot_startup_seconds", "Seconds from start-up to the first update", lambda: STARTUP.first_update or 0)
 
 # ==================== BOT HANDLERS ====================
 
-async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Modern Start Command with Beautiful Design"""
-    user = update.effective_user
-    
-    # Register user in database
-    try:
-        with db.conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO users (user_id, username, first_name, trial_end)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (user_id) DO UPDATE
-                SET username = EXCLUDED.username
-            """, (user.id, user.username, user.first_name, datetime.now() + timedelta(days=3)))
-            db.conn.commit()
-    except:
-        pass
-    
-    # BEAUTIFUL KEYBOARD DESIGN
-    keyboard = [
-        [InlineKeyboardButton("🚀 START FREE TRIAL", callback_data="start_trial")],
-        [InlineKeyboardButton("💎 UPGRADE TO PREMIUM", callback_data="buy_premium")],
-        [InlineKeyboardButton("🤖 DEPLOY YOUR BOT", callback_data="deploy_bot")],
-        [InlineKeyboardButton("📊 MY DASHBOARD", callback_data="my_dashboard")],
-        [InlineKeyboardButton("👥 REFER & EARN (+2H)", callback_data="refer_friend")],
-        [InlineKeyboardButton("❓ HELP & SUPPORT", callback_data="help_support")]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    # MODERN WELCOME MESSAGE
-    welcome_msg = f"""
-✨ **WELCOME {user.first_name}!** ✨
-
-🤖 **PREMIUM BOT HOSTING SERVICE**
-✅ 3 Days FREE Trial • Auto Deployment
-✅ Premium Features • 24/7 Support
-✅ Easy Setup • Secure Hosting
-
-⚡ **QUICK START:**
-1. Click *START FREE TRIAL*
-2. Upload your `bot.py` & `requirements.txt`
-3. We deploy on Railway instantly!
-
-🎁 **BONUS:** Get 2 FREE hours for each referral!
-
-📞 **Admin:** {ADMIN_USERNAME}
-🆔 **Your ID:** `{user.id}`
-
-👇 **SELECT AN OPTION BELOW:**
-    """
-    
-    await update.message.reply_text(welcome_msg, reply_markup=reply_markup, parse_mode='Markdown')
-
-async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """MAIN CALLBACK HANDLER - ALL BUTTON CLICKS"""
-    query = update.callback_query
-    await query.answer()
-    
-    data = query.data
-    user_id = query.from_user.id
-    
-    # ========== START TRIAL ==========
-    if data == "start_trial":
-        try:
-            with db.conn.cursor() as cur:
-                trial_end = datetime.now() + timedelta(days=3)
-                cur.execute("""
-                    UPDATE users SET trial_end = %s, plan = 'trial'
-                    WHERE user_id = %s
-                """, (trial_end, user_id))
-                db.conn.commit()
-            
-            await query.edit_message_text(
-                text=f"""
-✅ **FREE TRIAL ACTIVATED!**
-
-🎉 Congratulations! Your 3-day free trial is now active.
-📅 Trial Ends: {trial_end.strftime('%d %B %Y, %I:%M %p')}
-
-🚀 **NEXT STEPS:**
-1. Click *DEPLOY YOUR BOT* to upload your files
-2. We'll host your bot instantly
-3. Enjoy premium features for FREE
-
-💡 **Tip:** Refer friends to get extra hours!
-                """,
-                parse_mode='Markdown',
-                reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("🤖 DEPLOY BOT NOW", callback_data="deploy_bot")],
-                    [InlineKeyboardButton("📊 GO TO DASHBOARD", callback_data="my_dashboard")]
-                ])
-            )
-        except Exception as e:
-            await query.edit_message_text("❌ Error starting trial. Contact admin.")
-    
-    # ========== DEPLOY BOT ==========
-    elif data == "deploy_bot":
-        deploy_guide = """
+DEPLOY_GUIDE = templates.add("deploy_guide", """
 📦 **HOW TO DEPLOY YOUR BOT**
 
 ✅ **YOU NEED ONLY 2 FILES:**
@@ -213,53 +106,56 @@ async def start(update: Update, context):
 if __name__ == "__main__":
     app = Application.builder().token(BOT_TOKEN).build()
     app.add_handler(CommandHandler("start", start))
-    app.run_polling()                trial_end
-            ))
-            
-            user = cur.fetchone()
-            self.conn.commit()
-            return user
-    
-    def add_referral(self, referrer_id, referred_id):
-        """Add referral and give bonus"""
-        try:
-            with self.conn.cursor() as cur:
-                # Check if already referred
-                cur.execute("""
-                    SELECT id FROM referrals 
-                    WHERE referrer_id = %s AND referred_id = %s
-                """, (referrer_id, referred_id))
-                
-                if cur.fetchone():
-                    return False
-                
-                # Add referral record
-                cur.execute("""
-                    INSERT INTO referrals (referrer_id, referred_id)
-                    VALUES (%s, %s)
-                """, (referrer_id, referred_id))
-                
-                # Add 2 hours bonus
-                cur.execute("""
-                    UPDATE users 
-                    SET bot_expiry = bot_expiry + INTERVAL '2 hours'
-                    WHERE user_id = %s
-                    RETURNING bot_expiry
-                """, (referrer_id,))
-                
-                self.conn.commit()
-                return True
-        except Exception as e:
-            logger.error(f"Referral error: {e}")
-            self.conn.rollback()
-            return False
-
-# Initialize database
-db = Database()
+    app.run_polling()
+```
+
+**requirements.txt (Example):**
+```
+python-telegram-bot==20.7
+```
+
+⚠️ **IMPORTANT:**
+• Never hardcode your token - use `BOT_TOKEN` env variable
+• Keep all code inside `bot.py`
+
+📤 **Send both files here and we'll deploy automatically!**
+    """, keyboard=[
+    [InlineKeyboardButton("📊 GO TO DASHBOARD", callback_data="my_dashboard")]
+])
+
+async def deploy_guide(update: Update, context: ContextTypes.DEFAULT_TYPE, payload=None):
+    """Show the file upload guide"""
+    query = update.callback_query
+    
+    await query.edit_message_text(**DEPLOY_GUIDE.kwargs())
 
 # ==================== BOT COMMAND HANDLERS ====================
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+WELCOME = templates.add("welcome", """
+🤖 **Welcome to Bot Hosting Service!**
+
+👋 Hello {first_name}!
+
+🚀 **Get Started:**
+• 3 Days FREE Trial
+• Premium Bot Features
+• Easy Hosting on Railway
+• 24/7 Support
+
+🎁 **Referral Bonus:** Get 2 hours FREE for each friend you refer!
+
+📊 **Your Status:** {status}
+
+👉 Select an option below:
+    """, keyboard=[
+    [InlineKeyboardButton("🚀 Start Trial", callback_data="start_trial")],
+    [InlineKeyboardButton("💰 Buy Premium", callback_data="buy_premium")],
+    [InlineKeyboardButton("📊 My Dashboard", callback_data="my_dashboard")],
+    [InlineKeyboardButton("👥 Refer & Earn", callback_data="referral")],
+    [InlineKeyboardButton("🆘 Help", callback_data="help")]
+], escape=('first_name',))
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE, payload=None):
     """Handle /start command with referral system"""
     user = update.effective_user
     user_id = user.id
@@ -269,11 +165,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.args and len(context.args) > 0:
         try:
             referrer_id = int(context.args[0])
-        except:
+        except ValueError:
             pass
     
     # Get or create user
-    user_data = db.get_user(user_id)
+    user_data = await db.get_user(user_id)
     
     if not user_data:
         # New user registration
@@ -283,72 +179,23 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             'first_name': user.first_name,
             'last_name': user.last_name
         }
-        db.create_user(user_data)
+        await db.create_user(user_data)
         
         # Process referral if any
         if referrer_id and referrer_id != user_id:
-            if db.add_referral(referrer_id, user_id):
-                await update.message.reply_text(
+            if await db.add_referral(referrer_id, user_id):
+                await update.effective_message.reply_text(
                     "🎉 You joined via referral link!\n"
                     "The referrer received 2 hours bonus."
                 )
     
     # Send welcome message
-    keyboard = [
-        [InlineKeyboardButton("🚀 Start Trial", callback_data="start_trial")],
-        [InlineKeyboardButton("💰 Buy Premium", callback_data="buy_premium")],
-        [InlineKeyboardButton("📊 My Dashboard", callback_data="my_dashboard")],
-        [InlineKeyboardButton("👥 Refer & Earn", callback_data="referral")],
-        [InlineKeyboardButton("🆘 Help", callback_data="help")]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    welcome_msg = f"""
-🤖 **Welcome to Bot Hosting Service!**
-
-👋 Hello {user.first_name}!
+    await update.effective_message.reply_text(**WELCOME.kwargs(
+        first_name=user.first_name,
+        status='Active' if user_data else 'New User'
+    ))
 
-🚀 **Get Started:**
-• 3 Days FREE Trial
-• Premium Bot Features
-• Easy Hosting on Railway
-• 24/7 Support
-
-🎁 **Referral Bonus:** Get 2 hours FREE for each friend you refer!
-
-📊 **Your Status:** {'Active' if user_data else 'New User'}
-
-👉 Select an option below:
-    """
-    
-    await update.message.reply_text(
-        welcome_msg,
-        reply_markup=reply_markup,
-        parse_mode='Markdown'
-    )
-
-async def referral_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /referral command"""
-    user = update.effective_user
-    user_id = user.id
-    bot_username = context.bot.username
-    
-    # Generate referral link
-    referral_link = f"https://t.me/{bot_username}?start={user_id}"
-    
-    # Get referral stats
-    with db.conn.cursor() as cur:
-        cur.execute("""
-            SELECT COUNT(*) as total_refs FROM referrals 
-            WHERE referrer_id = %s
-        """, (user_id,))
-        stats = cur.fetchone()
-    
-    total_refs = stats['total_refs'] if stats else 0
-    total_bonus = total_refs * 2
-    
-    message = f"""
+REFERRAL = templates.add("referral", """
 📢 **REFERRAL SYSTEM**
 
 🔗 **Your Referral Link:**
@@ -369,11 +216,25 @@ async def referral_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 The 2 hours bonus is added to your bot runtime immediately.
 
 📈 **Track your referrals in dashboard**
-    """
+    """)
+
+async def referral_command(update: Update, context: ContextTypes.DEFAULT_TYPE, payload=None):
+    """Handle /referral command"""
+    user = update.effective_user
+    user_id = user.id
+    bot_username = context.bot.username
+    
+    # Generate referral link
+    referral_link = f"https://t.me/{bot_username}?start={user_id}"
     
+    # Get referral stats
+    total_refs = await db.count_referrals(user_id)
+    total_bonus = total_refs * 2
+    
+    # Only the keyboard depends on the user beyond the text fields
     keyboard = [
         [
-            InlineKeyboardButton("📋 Copy Link", callback_data="copy_ref_link"),
+            InlineKeyboardButton("📋 Copy Link", callback_data=f"ref:{user_id}"),
             InlineKeyboardButton("📊 My Stats", callback_data="ref_stats")
         ],
         [
@@ -385,23 +246,85 @@ The 2 hours bonus is added to your bot runtime immediately.
         ]
     ]
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    await update.effective_message.reply_text(**REFERRAL.kwargs(
+        InlineKeyboardMarkup(keyboard),
+        referral_link=referral_link,
+        total_refs=total_refs,
+        total_bonus=total_bonus
+    ))
+
+async def my_dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE, payload=None):
+    """Show user dashboard"""
+    user = update.effective_user
+    user_data = await db.get_user(user.id)
     
-    await update.message.reply_text(
-        message,
+    if not user_data:
+        await update.effective_message.reply_text("Please use /start first")
+        return
+    
+    dashboard_msg, reply_markup = await render_dashboard(user, user_data)
+    
+    await update.effective_message.reply_text(
+        dashboard_msg,
         reply_markup=reply_markup,
         parse_mode='Markdown'
     )
 
-async def my_dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Show user dashboard"""
+async def refresh_dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE, payload=None):
+    """Refresh button - redraw the dashboard in place"""
+    query = update.callback_query
     user = update.effective_user
-    user_data = db.get_user(user.id)
+    user_data = await db.get_user(user.id)
     
     if not user_data:
-        await update.message.reply_text("Please use /start first")
+        await query.edit_message_text("Please use /start first")
         return
     
+    dashboard_msg, reply_markup = await render_dashboard(user, user_data)
+    
+    await flood_control.edit(
+        query,
+        dashboard_msg,
+        reply_markup=reply_markup,
+        parse_mode='Markdown'
+    )
+
+DASHBOARD = templates.add("dashboard", """
+📊 **YOUR DASHBOARD**
+
+👤 **Account Info:**
+• User ID: `{user_id}`
+• Username: @{username}
+• Plan: {plan}
+
+⏰ **Bot Status:**
+• Status: {bot_status}
+• Time Remaining: {time_left}
+• Expiry: {expiry}
+
+📈 **Statistics:**
+• Total Referrals: {ref_count}
+• Bonus Hours: {bonus_hours} hours
+• Bot Active: {bot_active}
+
+🎯 **Quick Actions:**
+    """, keyboard=[
+    [
+        InlineKeyboardButton("🤖 Start My Bot", callback_data="start_my_bot"),
+        InlineKeyboardButton("⏰ Add Time", callback_data="add_time")
+    ],
+    [
+        InlineKeyboardButton("🔄 Refresh", callback_data="refresh_dash"),
+        InlineKeyboardButton("📞 Support", url=f"https://t.me/{ADMIN_USERNAME[1:]}")
+    ],
+    [
+        InlineKeyboardButton("💰 Upgrade Plan", callback_data="upgrade_plan"),
+        InlineKeyboardButton("🎁 Refer Friends", callback_data="referral")
+    ]
+], escape=('username',))
+
+async def render_dashboard(user, user_data):
+    """Dashboard text and keyboard for a user row"""
     # Calculate remaining time
     now = datetime.now()
     expiry = user_data['bot_expiry']
@@ -422,62 +345,23 @@ async def my_dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     bot_status = "🟢 Active" if user_data['bot_active'] else "🔴 Inactive"
     
     # Get referrals count
-    with db.conn.cursor() as cur:
-        cur.execute("""
-            SELECT COUNT(*) as ref_count FROM referrals 
-            WHERE referrer_id = %s
-        """, (user.id,))
-        ref_stats = cur.fetchone()
-    
-    ref_count = ref_stats['ref_count'] if ref_stats else 0
-    
-    dashboard_msg = f"""
-📊 **YOUR DASHBOARD**
-
-👤 **Account Info:**
-• User ID: `{user.id}`
-• Username: @{user.username or 'N/A'}
-• Plan: {user_data['plan_type'].upper()}
-
-⏰ **Bot Status:**
-• Status: {bot_status}
-• Time Remaining: {time_left}
-• Expiry: {expiry.strftime('%d/%m/%Y %H:%M') if expiry else 'N/A'}
-
-📈 **Statistics:**
-• Total Referrals: {ref_count}
-• Bonus Hours: {ref_count * 2} hours
-• Bot Active: {'Yes' if user_data['bot_active'] else 'No'}
-
-🎯 **Quick Actions:**
-    """
-    
-    keyboard = [
-        [
-            InlineKeyboardButton("🤖 Start My Bot", callback_data="start_my_bot"),
-            InlineKeyboardButton("⏰ Add Time", callback_data="add_time")
-        ],
-        [
-            InlineKeyboardButton("🔄 Refresh", callback_data="refresh_dash"),
-            InlineKeyboardButton("📞 Support", url=f"https://t.me/{ADMIN_USERNAME[1:]}")
-        ],
-        [
-            InlineKeyboardButton("💰 Upgrade Plan", callback_data="upgrade_plan"),
-            InlineKeyboardButton("🎁 Refer Friends", callback_data="referral")
-        ]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text(
-        dashboard_msg,
-        reply_markup=reply_markup,
-        parse_mode='Markdown'
+    ref_count = await db.count_referrals(user.id)
+    
+    dashboard_msg = DASHBOARD.render(
+        user_id=user.id,
+        username=user.username or 'N/A',
+        plan=user_data['plan_type'].upper(),
+        bot_status=bot_status,
+        time_left=time_left,
+        expiry=expiry.strftime('%d/%m/%Y %H:%M') if expiry else 'N/A',
+        ref_count=ref_count,
+        bonus_hours=ref_count * 2,
+        bot_active='Yes' if user_data['bot_active'] else 'No'
     )
+    
+    return dashboard_msg, DASHBOARD.keyboard
 
-async def buy_premium(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Show premium plans"""
-    plans_msg = """
+PREMIUM_PLANS = templates.add("premium_plans", """
 💰 **PREMIUM PLANS**
 
 🚀 **BASIC PLAN** - $5/month
@@ -510,73 +394,87 @@ async def buy_premium(update: Update, context: ContextTypes.DEFAULT_TYPE):
 2. Contact admin for payment
 3. Activate instantly after payment
 
-📞 **Contact Admin:** @CyperXploit
-    """
-    
-    keyboard = [
-        [
-            InlineKeyboardButton("💰 Basic - $5", callback_data="plan_basic"),
-            InlineKeyboardButton("🔥 Pro - $10", callback_data="plan_pro")
-        ],
-        [
-            InlineKeyboardButton("💎 Ultimate - $20", callback_data="plan_ultimate")
-        ],
-        [
-            InlineKeyboardButton("📞 Contact Admin", url=f"https://t.me/{ADMIN_USERNAME[1:]}"),
-            InlineKeyboardButton("💬 Payment Info", callback_data="payment_info")
-        ],
-        [
-            InlineKeyboardButton("⬅️ Back", callback_data="main_menu")
-        ]
+📞 **Contact Admin:** {admin_username}
+    """, keyboard=[
+    [
+        InlineKeyboardButton("💰 Basic - $5", callback_data="plan:basic"),
+        InlineKeyboardButton("🔥 Pro - $10", callback_data="plan:pro")
+    ],
+    [
+        InlineKeyboardButton("💎 Ultimate - $20", callback_data="plan:ultimate")
+    ],
+    [
+        InlineKeyboardButton("📞 Contact Admin", url=f"https://t.me/{ADMIN_USERNAME[1:]}"),
+        InlineKeyboardButton("💬 Payment Info", callback_data="payment_info")
+    ],
+    [
+        InlineKeyboardButton("⬅️ Back", callback_data="main_menu")
     ]
+])
+
+async def buy_premium(update: Update, context: ContextTypes.DEFAULT_TYPE, payload=None):
+    """Show premium plans"""
+    await update.effective_message.reply_text(**PREMIUM_PLANS.kwargs())
+
+PLANS = {
+    'basic': {'name': "🚀 BASIC PLAN", 'price': 5, 'days': 30, 'bots': 1},
+    'pro': {'name': "🔥 PRO PLAN", 'price': 10, 'days': 60, 'bots': 3},
+    'ultimate': {'name': "💎 ULTIMATE PLAN", 'price': 20, 'days': 90, 'bots': 10}
+}
+
+def plan_id(value):
+    """Callback payload parser for plan:<id>"""
+    if value not in PLANS:
+        raise ValueError(f"Unknown plan: {value}")
+    return value
+
+async def show_plan(update: Update, context: ContextTypes.DEFAULT_TYPE, payload=None):
+    """Selected plan details"""
+    query = update.callback_query
+    plan = PLANS[payload]
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.edit_message_text(
+        text=f"{plan['name']} - ${plan['price']}/month\n\n"
+             f"• {plan['days']} Days Bot Hosting\n"
+             f"• {plan['bots']} Bot Deployment(s)\n\n"
+             f"👉 Send your User ID `{query.from_user.id}` and plan *{payload}* to {ADMIN_USERNAME}.\n"
+             f"✅ Fast activation after payment.",
+        parse_mode='Markdown',
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("📞 Contact Admin", url=f"https://t.me/{ADMIN_USERNAME[1:]}")],
+            [InlineKeyboardButton("⬅️ Back", callback_data="buy_premium")]
+        ])
+    )
+
+async def copy_ref_link(update: Update, context: ContextTypes.DEFAULT_TYPE, payload=None):
+    """Show the referral link for ref:<user_id>"""
+    query = update.callback_query
     
-    await update.message.reply_text(
-        plans_msg,
-        reply_markup=reply_markup,
+    await query.edit_message_text(
+        text=f"✅ **Your referral link:**\n\nShare this with your friends:\n"
+             f"`https://t.me/{context.bot.username}?start={payload}`\n\n"
+             f"Each referral gives you 2 hours FREE!",
         parse_mode='Markdown'
     )
 
-async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle all callback queries"""
+async def contact_admin(update: Update, context: ContextTypes.DEFAULT_TYPE, payload=None):
+    """Admin contact details"""
     query = update.callback_query
-    await query.answer()
-    
-    data = query.data
-    user_id = query.from_user.id
-    
-    if data == "start_trial":
-        await start_trial(query, user_id)
-    
-    elif data == "referral":
-        await referral_command(update, context)
     
-    elif data == "my_dashboard":
-        await my_dashboard(update, context)
-    
-    elif data == "buy_premium":
-        await buy_premium(update, context)
-    
-    elif data == "copy_ref_link":
-        await query.edit_message_text(
-            text="✅ **Link copied to clipboard!**\n\nShare this with your friends:\n`https://t.me/your_bot?start={user_id}`\n\nEach referral gives you 2 hours FREE!",
-            parse_mode='Markdown'
-        )
-    
-    elif data == "contact_admin":
-        await query.edit_message_text(
-            text=f"📞 **Contact Admin:**\n\n"
-                 f"Username: {ADMIN_USERNAME}\n"
-                 f"ID: {ADMIN_ID}\n\n"
-                 f"Send your User ID and plan choice.\n"
-                 f"✅ Fast activation after payment.",
-            parse_mode='Markdown'
-        )
+    await query.edit_message_text(
+        text=f"📞 **Contact Admin:**\n\n"
+             f"Username: {ADMIN_USERNAME}\n"
+             f"ID: {ADMIN_ID}\n\n"
+             f"Send your User ID and plan choice.\n"
+             f"✅ Fast activation after payment.",
+        parse_mode='Markdown'
+    )
 
-async def start_trial(query, user_id):
+async def start_trial(update: Update, context: ContextTypes.DEFAULT_TYPE, payload=None):
     """Start user trial bot"""
-    user_data = db.get_user(user_id)
+    query = update.callback_query
+    user_id = query.from_user.id
+    user_data = await db.get_user(user_id)
     
     if not user_data:
         await query.edit_message_text("Please use /start first")
@@ -593,17 +491,10 @@ async def start_trial(query, user_id):
         return
     
     # Start trial
-    with db.conn.cursor() as cur:
-        trial_start = datetime.now()
-        trial_end = trial_start + timedelta(days=3)
-        
-        cur.execute("""
-            UPDATE users 
-            SET trial_start = %s, trial_end = %s, bot_expiry = %s
-            WHERE user_id = %s
-        """, (trial_start, trial_end, trial_end, user_id))
-        
-        db.conn.commit()
+    trial_start = datetime.now()
+    trial_end = trial_start + timedelta(days=3)
+    await db.start_trial(user_id, trial_start, trial_end)
+    expiry.wake()
     
     await query.edit_message_text(
         "🎉 **Trial Started Successfully!**\n\n"
@@ -616,31 +507,73 @@ async def start_trial(query, user_id):
         "💡 **Tip:** Refer friends to get FREE hours!"
     )
 
-# ==================== ADMIN COMMANDS ====================
+# ==================== FILE UPLOADS ====================
 
-async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Admin panel - only for admin"""
+async def handle_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Receive bot.py / requirements.txt for the user's next deployment"""
+    message = update.effective_message
     user_id = update.effective_user.id
+    document = message.document
     
-    if user_id != ADMIN_ID:
-        await update.message.reply_text("⛔ Access Denied!")
+    if document.file_name not in REQUIRED_FILES:
+        await message.reply_text("⚠️ Please send only `bot.py` or `requirements.txt`.", parse_mode='Markdown')
         return
     
-    with db.conn.cursor() as cur:
-        # Get stats
-        cur.execute("SELECT COUNT(*) as total_users FROM users")
-        total_users = cur.fetchone()['total_users']
-        
-        cur.execute("SELECT COUNT(*) as active_trials FROM users WHERE trial_end > NOW()")
-        active_trials = cur.fetchone()['active_trials']
-        
-        cur.execute("SELECT COUNT(*) as premium_users FROM users WHERE premium_status = TRUE")
-        premium_users = cur.fetchone()['premium_users']
-        
-        cur.execute("SELECT COUNT(*) as total_refs FROM referrals")
-        total_refs = cur.fetchone()['total_refs']
+    try:
+        if document.file_size and document.file_size > uploads.max_bytes:
+            raise UploadTooLarge(document.file_size)
+        tg_file = await context.bot.get_file(document.file_id)
+        sha256, size, _ = await uploads.save(tg_file.file_path, document.file_size)
+    except UploadTooLarge:
+        await message.reply_text(f"❌ File too large (max {uploads.max_bytes // 1024} KB).")
+        return
+    except Exception as e:
+        logger.error(f"Upload from {user_id} failed: {e}")
+        await message.reply_text("❌ Upload failed, please send the file again.")
+        return
     
-    admin_msg = f"""
+    if document.file_name == "requirements.txt":
+        try:
+            with open(uploads.path_for(sha256), encoding="utf-8", errors="replace") as f:
+                normalize_requirements(f.read())
+        except InvalidRequirements as e:
+            await message.reply_text(
+                f"❌ {e}\n\nOnly package lines like requests==2.31.0 are accepted: "
+                "no pip options, URLs or paths."
+            )
+            return
+    
+    deployment_id, complete, has_token = await db.attach_upload(user_id, document.file_name, sha256, size, REQUIRED_FILES)
+    
+    if complete and has_token:
+        deploy_queue.wake()
+        await message.reply_text(
+            f"✅ All files received! Deployment #{deployment_id} is queued.\n"
+            "You'll get a message as soon as your bot is live.",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🛑 Cancel deployment", callback_data=f"deploy_cancel:{deployment_id}")]
+            ])
+        )
+    elif complete:
+        # Nothing collects bot tokens yet, so don't promise a deploy
+        await message.reply_text(
+            f"✅ All files received and saved as deployment #{deployment_id}.\n"
+            f"It will be queued once your bot token is set up - contact {ADMIN_USERNAME}."
+        )
+    else:
+        await message.reply_text(f"✅ `{document.file_name}` received. Now send the other file.", parse_mode='Markdown')
+
+async def cancel_deployment(update: Update, context: ContextTypes.DEFAULT_TYPE, payload=None):
+    """Cancel button on a queued deployment"""
+    query = update.callback_query
+    if await deploy_queue.cancel(payload, query.from_user.id):
+        await query.edit_message_text(f"🛑 Cancelling deployment #{payload}...")
+    else:
+        await query.edit_message_text(f"Deployment #{payload} can no longer be cancelled.")
+
+# ==================== ADMIN COMMANDS ====================
+
+ADMIN_PANEL = templates.add("admin_panel", """
 👑 **ADMIN PANEL**
 
 📊 **Statistics:**
@@ -650,28 +583,50 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • Total Referrals: {total_refs}
 • Revenue Today: $0.00
 
+🕒 As of: {as_of}
+
 🔧 **Quick Actions:**
-    """
-    
-    keyboard = [
-        [
-            InlineKeyboardButton("📋 User List", callback_data="admin_users"),
-            InlineKeyboardButton("💰 Payments", callback_data="admin_payments")
-        ],
-        [
-            InlineKeyboardButton("🤖 Bots Status", callback_data="admin_bots"),
-            InlineKeyboardButton("🎁 Add Bonus", callback_data="admin_add_bonus")
-        ],
-        [
-            InlineKeyboardButton("📊 Full Stats", callback_data="admin_stats"),
-            InlineKeyboardButton("📢 Broadcast", callback_data="admin_broadcast")
-        ],
-        [
-            InlineKeyboardButton("🔄 Refresh", callback_data="admin_refresh")
-        ]
+    """, keyboard=[
+    [
+        InlineKeyboardButton("📋 User List", callback_data="admin_users"),
+        InlineKeyboardButton("💰 Payments", callback_data="admin_payments")
+    ],
+    [
+        InlineKeyboardButton("🤖 Bots Status", callback_data="admin_bots"),
+        InlineKeyboardButton("🎁 Add Bonus", callback_data="admin_add_bonus")
+    ],
+    [
+        InlineKeyboardButton("📊 Full Stats", callback_data="admin_stats"),
+        InlineKeyboardButton("📢 Broadcast", callback_data="admin_broadcast")
+    ],
+    [
+        InlineKeyboardButton("🔄 Refresh", callback_data="admin_refresh")
     ]
+])
+
+def render_admin_panel(stats, as_of):
+    """Admin panel text and keyboard for a stats snapshot"""
+    admin_msg = ADMIN_PANEL.render(
+        total_users=stats['total_users'],
+        active_trials=stats['active_trials'],
+        premium_users=stats['premium_users'],
+        total_refs=stats['total_refs'],
+        as_of=as_of.strftime('%d/%m/%Y %H:%M:%S')
+    )
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    return admin_msg, ADMIN_PANEL.keyboard
+
+async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin panel - only for admin"""
+    user_id = update.effective_user.id
+    
+    if user_id != ADMIN_ID:
+        await update.message.reply_text("⛔ Access Denied!")
+        return
+    
+    # Get stats from the snapshot
+    stats, as_of = await admin_stats.get()
+    admin_msg, reply_markup = render_admin_panel(stats, as_of)
     
     await update.message.reply_text(
         admin_msg,
@@ -679,12 +634,245 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode='Markdown'
     )
 
+async def admin_refresh(update: Update, context: ContextTypes.DEFAULT_TYPE, payload=None):
+    """Refresh and Back buttons - redraw from the snapshot, re-querying only once it is stale"""
+    query = update.callback_query
+    if query.from_user.id != ADMIN_ID:
+        return
+    
+    # Always redraw: the message may show an older snapshot or another admin view
+    stats, as_of = await admin_stats.get()
+    admin_msg, reply_markup = render_admin_panel(stats, as_of)
+    await flood_control.edit(query, admin_msg, reply_markup, parse_mode='Markdown')
+
+async def admin_full_stats(update: Update, context: ContextTypes.DEFAULT_TYPE, payload=None):
+    """Full Stats button - internal counters for the admin"""
+    query = update.callback_query
+    if query.from_user.id != ADMIN_ID:
+        return
+    
+    cache = db.user_cache.stats()
+    builds = build_cache.stats()
+    flood = flood_control.stats()
+    writes = db.user_writes.stats()
+    routes = sorted(router.stats().items(), key=lambda item: -item[1]['calls'])[:10]
+    route_lines = "\n".join(
+        f"• {action}: {m['calls']} calls, {m['errors']} errors, {m['avg_time'] * 1000:.0f}ms avg"
+        for action, m in routes
+    )
+    
+    await query.edit_message_text(
+        text=f"📊 FULL STATS\n\n"
+             f"🗄 User cache: {cache['hits']} hits / {cache['misses']} misses "
+             f"({cache['hit_rate']:.0%}), {cache['size']} rows\n"
+             f"✍️ Write buffer: {writes['pending_rows']} pending, {writes['rows_written']} written, "
+             f"last lag {writes['last_flush_lag'] * 1000:.0f}ms\n"
+             f"📦 Build cache: {builds['hit_rate']:.0%} hit rate, "
+             f"{builds['avg_build_seconds']:.1f}s avg build\n"
+             f"🚦 Flood control: {flood['limited']} limited, {flood['coalesced']} coalesced, "
+             f"{flood['unchanged_edits']} unchanged edits\n\n"
+             f"🔘 Buttons:\n{route_lines or '• none yet'}",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("⬅️ Back", callback_data="admin_panel")]
+        ])
+    )
+
+HEALTH_LABELS = [
+    ('healthy', "🟢 Healthy"),
+    ('stalled', "🟡 Stalled"),
+    ('webhook_error', "🟠 Webhook errors"),
+    ('invalid_token', "🔴 Invalid token"),
+    ('unreachable', "⚪ Not reachable"),
+    ('unprobed', "⏳ Not probed yet")
+]
+
+async def admin_bots(update: Update, context: ContextTypes.DEFAULT_TYPE, payload=None):
+    """Bots Status button - health of hosted bots from the supervisor's last probes"""
+    query = update.callback_query
+    if query.from_user.id != ADMIN_ID:
+        return
+    
+    summary, problems = await db.bot_health()
+    lines = ["🤖 BOTS STATUS\n"]
+    for state, label in HEALTH_LABELS:
+        row = summary.get(state)
+        if row is None:
+            continue
+        latency = f" ({row['avg_latency_ms']:.0f}ms avg)" if row['avg_latency_ms'] is not None else ""
+        lines.append(f"{label}: {row['bots']}{latency}")
+    if not summary:
+        lines.append("No running bots")
+    problem_lines = "\n".join(
+        f"• #{row['id']} {row['bot_name']} (owner {row['user_id']}): {row['health']}, "
+        f"{row['probe_failures']} failed probes{' - ' + row['health_detail'] if row['health_detail'] else ''}"
+        for row in problems
+    )
+    
+    await flood_control.edit(
+        query,
+        text="\n".join(lines) +
+             f"\n\n⚠️ Needs attention:\n{problem_lines or '• nothing'}\n\n"
+             f"Restarts so far: {supervisor.restarts}",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔄 Refresh", callback_data="admin_bots")],
+            [InlineKeyboardButton("⬅️ Back", callback_data="admin_panel")]
+        ])
+    )
+
+async def reconcile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Rebuild referral counters from the referrals table - admin only"""
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("⛔ Access Denied!")
+        return
+    
+    fixed = await db.reconcile_referral_counts()
+    if fixed is None:
+        await update.message.reply_text("⏳ A reconcile is already running on another replica")
+        return
+    await update.message.reply_text(f"✅ Referral counters reconciled ({fixed} corrected)")
+
+async def admin_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE, payload=None):
+    """Broadcast button - explains how to start one"""
+    query = update.callback_query
+    if query.from_user.id != ADMIN_ID:
+        return
+    
+    await query.edit_message_text(
+        text="📢 **Broadcast**\n\n"
+             "Send `/broadcast your message` to deliver it to every user.\n"
+             "Progress is shown live and can be stopped at any time.",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("⬅️ Back", callback_data="admin_panel")]
+        ]),
+        parse_mode='Markdown'
+    )
+
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Queue a message for every user - admin only"""
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("⛔ Access Denied!")
+        return
+    
+    parts = update.message.text.split(None, 1)
+    if len(parts) < 2:
+        await update.message.reply_text("Usage: /broadcast your message")
+        return
+    
+    status = await update.message.reply_text("📢 Broadcast queued...")
+    row = await broadcaster.create(parts[1], status.chat_id, status.message_id)
+    await status.edit_text(
+        f"📢 Broadcast #{row['id']} queued for {row['total']} users.",
+        reply_markup=Broadcaster.stop_markup(row['id'])
+    )
+
+async def stop_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE, payload=None):
+    """Stop button on a broadcast's progress message"""
+    query = update.callback_query
+    if query.from_user.id != ADMIN_ID:
+        return
+    
+    if await broadcaster.cancel(payload):
+        await query.edit_message_text(f"🛑 Stopping broadcast #{payload}...")
+
+# ==================== CALLBACK ROUTES ====================
+
+router.add("start_trial", start_trial)
+router.add("deploy_bot", deploy_guide)
+router.add("my_dashboard", my_dashboard)
+router.add("refresh_dash", refresh_dashboard)
+router.add("referral", referral_command)
+router.add("refer_friend", referral_command)
+router.add("ref", copy_ref_link, parse=int)
+router.add("buy_premium", buy_premium)
+router.add("upgrade_plan", buy_premium)
+router.add("plan", show_plan, parse=plan_id)
+router.add("payment_info", contact_admin)
+router.add("contact_admin", contact_admin)
+router.add("help", contact_admin)
+router.add("help_support", contact_admin)
+router.add("main_menu", start)
+router.add("deploy_cancel", cancel_deployment, parse=int)
+router.add("admin_refresh", admin_refresh)
+router.add("admin_panel", admin_refresh)
+router.add("admin_stats", admin_full_stats)
+router.add("admin_bots", admin_bots)
+router.add("admin_broadcast", admin_broadcast)
+router.add("bcast_stop", stop_broadcast, parse=int)
+
 # ==================== MAIN FUNCTION ====================
 
-def main():
-    """Start the bot"""
+async def post_init(application: Application):
+    """Start background services once the event loop is running"""
+    STARTUP.mark("initialize")
+    # Schema check runs in the background; the first query waits for it
+    STARTUP.track("database", await db.connect())
+    cluster_bus.start()
+    admin_stats.start()
+    
+    async def notify_deployment(job, status, error):
+        text = {
+            'running': f"✅ Your bot *{job['bot_name']}* is deployed and running!",
+            'failed': f"❌ Deployment of *{job['bot_name']}* failed. Contact {ADMIN_USERNAME}.",
+            'cancelled': f"🛑 Deployment of *{job['bot_name']}* was cancelled."
+        }[status]
+        await application.bot.send_message(job['user_id'], text, parse_mode='Markdown')
+    
+    deploy_queue.notify = notify_deployment
+    deploy_queue.start()
+    
+    expiry.bot = application.bot
+    expiry.start()
+    
+    broadcaster.bot = application.bot
+    broadcaster.start()
+    
+    async def notify_health(row, event):
+        text = {
+            'invalid_token': f"🔴 Telegram rejects the token of your bot *{row['bot_name']}*. "
+                             f"Revoked it? Send the new token to {ADMIN_USERNAME}.",
+            'restarted': f"🔄 Your bot *{row['bot_name']}* stopped answering and was restarted.",
+            'down': f"⚠️ Your bot *{row['bot_name']}* stopped answering. Contact {ADMIN_USERNAME}."
+        }[event]
+        await application.bot.send_message(row['user_id'], text, parse_mode='Markdown')
+    
+    supervisor.notify = notify_health
+    supervisor.start()
+    
+    application.bot_data['metrics_server'] = await start_metrics_server()
+    STARTUP.mark("services")
+
+async def post_shutdown(application: Application):
+    """Release pooled database connections"""
+    if application.bot_data.get('metrics_server') is not None:
+        await application.bot_data['metrics_server'].stop()
+    await supervisor.stop()
+    await supervisor.close()
+    await broadcaster.stop()
+    await expiry.stop()
+    await deploy_queue.stop()
+    await deployer.close()
+    await uploads.close()
+    await admin_stats.stop()
+    await cluster_bus.stop()
+    await db.close()
+
+def build_application(builder=None):
+    """Manager application with every handler registered.
+
+    Returns (application, allowed_updates); builder lets the benchmark point
+    the bot at a fake Bot API server.
+    """
     # Create application
-    application = Application.builder().token(BOT_TOKEN).build()
+    application = (
+        (builder or Application.builder())
+        .token(BOT_TOKEN)
+        .request(InstrumentedRequest(connection_pool_size=256))
+        .concurrent_updates(True)
+        .update_queue(bounded_update_queue())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     # Add handlers
     application.add_handler(CommandHandler("start", start))
@@ -692,13 +880,37 @@ def main():
     application.add_handler(CommandHandler("dashboard", my_dashboard))
     application.add_handler(CommandHandler("premium", buy_premium))
     application.add_handler(CommandHandler("admin", admin_panel))
+    application.add_handler(CommandHandler("reconcile", reconcile_command))
+    application.add_handler(CommandHandler("broadcast", broadcast_command))
+    application.add_handler(MessageHandler(
+        filters.Document.ALL & filters.UpdateType.MESSAGE & filters.ChatType.PRIVATE, handle_upload
+    ))
     
     # Callback handlers
-    application.add_handler(CallbackQueryHandler(handle_callback))
+    application.add_handler(CallbackQueryHandler(router.dispatch))
+    
+    # Guards run before every handler above: shard ownership, then per-user limits
+    install_shard_guard(application)
+    flood_control.install(application)
+    
+    allowed_updates = restrict_update_types(application)
+    
+    # Time every handler and callback route registered above
+    instrument_application(application, router)
+    REGISTRY.gauge_callback("bot_update_queue_size", "Updates waiting to be processed", application.update_queue.qsize)
+    
+    return application, allowed_updates
+
+def main():
+    """Start the bot"""
+    STARTUP.mark("imports")
+    application, allowed_updates = build_application()
+    STARTUP.mark("handlers")
+    STARTUP.install(application)
     
     # Start bot
     print("🤖 Bot is running...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    run_application(application, allowed_updates=allowed_updates)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+HOT-PATH METRICS
+Timing histograms, error counters and in-flight gauges in Prometheus text format
+"""
+
+import os
+import time
+import bisect
+import asyncio
+import inspect
+import logging
+import functools
+from contextlib import contextmanager
+
+from telegram.ext import ApplicationHandlerStop
+from telegram.request import HTTPXRequest
+
+from webhook import HTTPServer, health_route
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self):
+        lines = self.header()
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + value
+
+    def dec(self, value=1, **labels):
+        self.inc(-value, **labels)
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        entry = self.values.get(key)
+        if entry is None:
+            # Per-bucket counts (last one is +Inf), sum, count
+            entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = self.header()
+        names = self.labelnames + ("le",)
+        for key, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels(names, key + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    """All metrics of the process, rendered on scrape"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.callbacks = []
+
+    def _add(self, metric):
+        if metric.name in self.metrics:
+            return self.metrics[metric.name]
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def gauge_callback(self, name, help, fn):
+        """Gauge read from fn() at scrape time, for counters kept elsewhere"""
+        gauge = self.gauge(name, help)
+        self.callbacks.append((gauge, fn))
+        return gauge
+
+    def render(self):
+        for gauge, fn in self.callbacks:
+            try:
+                gauge.set(fn())
+            except Exception as e:
+                logger.debug(f"Metric {gauge.name} unavailable: {e}")
+        lines = []
+        for metric in self.metrics.values():
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class Timer:
+    """Histogram + error counter + in-flight gauge for one kind of call"""
+
+    def __init__(self, prefix, help, label, registry=REGISTRY):
+        self.label = label
+        self.seconds = registry.histogram(f"{prefix}_seconds", f"{help} latency", (label,))
+        self.errors = registry.counter(f"{prefix}_errors_total", f"{help} errors", (label,))
+        self.in_flight = registry.gauge(f"{prefix}_in_flight", f"{help} in progress", (label,))
+
+    def wrap(self, fn, name=None):
+        """Async fn timed under label value name"""
+        labels = {self.label: name or fn.__name__}
+
+        @functools.wraps(fn)
+        async def timed(*args, **kwargs):
+            self.in_flight.inc(**labels)
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except (ApplicationHandlerStop, asyncio.CancelledError):
+                raise
+            except Exception:
+                self.errors.inc(**labels)
+                raise
+            finally:
+                self.seconds.observe(time.perf_counter() - started, **labels)
+                self.in_flight.dec(**labels)
+
+        timed.__wrapped_timer__ = self
+        return timed
+
+
+HANDLERS = Timer("bot_handler", "Update handler", "handler")
+DATABASE = Timer("bot_db", "Database call", "method")
+TELEGRAM = Timer("bot_telegram_api", "Telegram Bot API request", "method")
+
+
+# ==================== INSTRUMENTATION ====================
+
+def instrument_application(application, router=None):
+    """Time every registered handler and, if given, every callback route"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if inspect.iscoroutinefunction(handler.callback) and not hasattr(handler.callback, '__wrapped_timer__'):
+                handler.callback = HANDLERS.wrap(handler.callback)
+    if router is not None:
+        for action, (handler, parse) in router.routes.items():
+            if not hasattr(handler, '__wrapped_timer__'):
+                router.routes[action] = (HANDLERS.wrap(handler, f"callback:{action}"), parse)
+
+
+def instrument_methods(obj, timer=DATABASE, exclude=("connect", "close")):
+    """Time the public coroutine methods of one object"""
+    for name, method in inspect.getmembers(obj, inspect.iscoroutinefunction):
+        if name.startswith("_") or name in exclude:
+            continue
+        setattr(obj, name, timer.wrap(method, name))
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that times each Bot API method"""
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        labels = {TELEGRAM.label: url.rsplit("/", 1)[-1]}
+        TELEGRAM.in_flight.inc(**labels)
+        started = time.perf_counter()
+        try:
+            return await super().do_request(url, method, request_data, **kwargs)
+        except Exception:
+            TELEGRAM.errors.inc(**labels)
+            raise
+        finally:
+            TELEGRAM.seconds.observe(time.perf_counter() - started, **labels)
+            TELEGRAM.in_flight.dec(**labels)
+
+
+# ==================== ENDPOINT ====================
+
+def metrics_route(registry=REGISTRY):
+    async def handle(method, headers, body):
+        if method != "GET":
+            return 405, b"", "text/plain"
+        return 200, registry.render().encode(), "text/plain; version=0.0.4"
+    return handle
+
+
+async def start_metrics_server(registry=REGISTRY, host=None, port=None):
+    """Serve /metrics on METRICS_HOST:METRICS_PORT, None when disabled"""
+    port = int(port if port is not None else os.getenv("METRICS_PORT", 9100))
+    if not port:
+        return None
+    server = HTTPServer(host or os.getenv("METRICS_HOST", "127.0.0.1"), port)
+    server.add_route("/metrics", metrics_route(registry))
+    server.add_route("/health", health_route)
+    try:
+        await server.start()
+    except OSError as e:
+        logger.warning(f"Metrics endpoint disabled: {e}")
+        return None
+    return server
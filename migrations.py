@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+VERSIONED SCHEMA MIGRATIONS
+Applied in order at startup, each in its own transaction
+"""
+
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key so concurrent replicas apply migrations one at a time
+MIGRATION_LOCK_ID = 7_971_284_841
+
+# Seconds a migration may run; 0 = no limit (the pool's DB_QUERY_TIMEOUT is for queries)
+MIGRATION_TIMEOUT = float(os.getenv("DB_MIGRATION_TIMEOUT", 0))
+
+# (version, description, statements) - append only, never edit a shipped entry
+MIGRATIONS = [
+    (1, "base tables", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id BIGINT PRIMARY KEY,
+            username VARCHAR(100),
+            first_name VARCHAR(100),
+            status VARCHAR(20) DEFAULT 'active',
+            trial_end TIMESTAMP,
+            plan VARCHAR(20) DEFAULT 'trial',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS deployments (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT,
+            bot_name VARCHAR(100),
+            status VARCHAR(20) DEFAULT 'pending',
+            files_uploaded BOOLEAN DEFAULT FALSE,
+            bot_token VARCHAR(200),
+            railway_url VARCHAR(500),
+            cancel_requested BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS referrals (
+            id SERIAL PRIMARY KEY,
+            referrer_id BIGINT,
+            referred_id BIGINT,
+            bonus_given BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    ]),
+    (2, "user columns read by the dashboard and trial flow", [
+        """
+        ALTER TABLE users
+            ADD COLUMN IF NOT EXISTS last_name VARCHAR(100),
+            ADD COLUMN IF NOT EXISTS trial_start TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS bot_expiry TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS bot_active BOOLEAN DEFAULT FALSE,
+            ADD COLUMN IF NOT EXISTS plan_type VARCHAR(20) DEFAULT 'trial',
+            ADD COLUMN IF NOT EXISTS premium_status BOOLEAN DEFAULT FALSE
+        """
+    ]),
+    (3, "hot-path indexes and unique referrals", [
+        # Drop duplicate referrals so the unique index can be built
+        """
+        DELETE FROM referrals a USING referrals b
+        WHERE a.referrer_id = b.referrer_id
+          AND a.referred_id = b.referred_id
+          AND a.id > b.id
+        """,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS referrals_referrer_referred_key
+        ON referrals (referrer_id, referred_id)
+        """,
+        "CREATE INDEX IF NOT EXISTS deployments_user_id_idx ON deployments (user_id)",
+        "CREATE INDEX IF NOT EXISTS users_trial_end_idx ON users (trial_end)"
+    ]),
+    (4, "materialized referral counters", [
+        """
+        CREATE TABLE IF NOT EXISTS referral_counts (
+            referrer_id BIGINT PRIMARY KEY,
+            total INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        INSERT INTO referral_counts (referrer_id, total)
+        SELECT referrer_id, COUNT(*) FROM referrals
+        WHERE referrer_id IS NOT NULL
+        GROUP BY referrer_id
+        ON CONFLICT (referrer_id) DO UPDATE
+        SET total = EXCLUDED.total, updated_at = NOW()
+        """
+    ]),
+    (5, "shared hosting for template bots", [
+        # 'railway' = own service, 'shared' = multi-tenant runner
+        "ALTER TABLE deployments ADD COLUMN IF NOT EXISTS hosting VARCHAR(20) DEFAULT 'railway'",
+        """
+        CREATE INDEX IF NOT EXISTS deployments_shared_running_idx
+        ON deployments (id) WHERE hosting = 'shared' AND status = 'running'
+        """
+    ]),
+    (6, "per-owner keyword auto-replies", [
+        """
+        CREATE TABLE IF NOT EXISTS bot_keywords (
+            id SERIAL PRIMARY KEY,
+            owner_id BIGINT NOT NULL,
+            keyword VARCHAR(200) NOT NULL,
+            reply TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            whole_word BOOLEAN NOT NULL DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS bot_keywords_owner_idx ON bot_keywords (owner_id, id)"
+    ]),
+    (7, "deployment job queue", [
+        """
+        ALTER TABLE deployments
+            ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS last_error TEXT,
+            ADD COLUMN IF NOT EXISTS locked_until TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS service_id VARCHAR(100)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS deployments_queue_idx
+        ON deployments (id) WHERE status IN ('pending', 'deploying')
+        """
+    ]),
+    (8, "uploaded deployment files", [
+        """
+        CREATE TABLE IF NOT EXISTS deployment_files (
+            deployment_id INTEGER NOT NULL REFERENCES deployments (id) ON DELETE CASCADE,
+            file_name VARCHAR(100) NOT NULL,
+            sha256 CHAR(64) NOT NULL,
+            size INTEGER NOT NULL,
+            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (deployment_id, file_name)
+        )
+        """
+    ]),
+    (9, "dependency build cache", [
+        """
+        CREATE TABLE IF NOT EXISTS build_cache (
+            requirements_hash CHAR(64) PRIMARY KEY,
+            requirements TEXT NOT NULL,
+            build_seconds REAL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        ALTER TABLE deployments
+            ADD COLUMN IF NOT EXISTS requirements_hash CHAR(64),
+            ADD COLUMN IF NOT EXISTS build_cache_hit BOOLEAN,
+            ADD COLUMN IF NOT EXISTS build_seconds REAL
+        """
+    ]),
+    (10, "bot expiry scheduling", [
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS expiry_stage SMALLINT NOT NULL DEFAULT 0",
+        # Serves both the next-due lookup and the due-batch claims
+        """
+        CREATE INDEX IF NOT EXISTS users_expiry_due_idx
+        ON users (expiry_stage, bot_expiry)
+        WHERE expiry_stage < 2 AND bot_expiry IS NOT NULL
+        """
+    ]),
+    (11, "resumable admin broadcasts", [
+        """
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id SERIAL PRIMARY KEY,
+            text TEXT NOT NULL,
+            admin_chat_id BIGINT NOT NULL,
+            message_id BIGINT,
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            total INTEGER NOT NULL DEFAULT 0,
+            last_user_id BIGINT NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0,
+            locked_until TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        """
+    ]),
+    (12, "hosted bot health probes", [
+        """
+        ALTER TABLE deployments
+            ADD COLUMN IF NOT EXISTS health VARCHAR(20),
+            ADD COLUMN IF NOT EXISTS health_detail TEXT,
+            ADD COLUMN IF NOT EXISTS probe_latency_ms REAL,
+            ADD COLUMN IF NOT EXISTS probe_failures INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS last_probe_at TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS next_probe_at TIMESTAMP
+        """,
+        # Due-probe claims only ever look at running bots
+        """
+        CREATE INDEX IF NOT EXISTS deployments_next_probe_idx
+        ON deployments (next_probe_at NULLS FIRST)
+        WHERE status = 'running'
+        """
+    ])
+]
+
+
+def _applied_versions(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(200),
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row['version'] for row in cur.fetchall()}
+
+
+def _apply(version, name, statements):
+    def fn(cur):
+        # Set first: waiting for another replica's migration takes as long as it does
+        cur.execute("SET LOCAL statement_timeout = %s", (int(MIGRATION_TIMEOUT * 1000),))
+        # Serialize with other replicas, then re-check under the lock
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+        cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (version,))
+        if cur.fetchone():
+            return False
+        for statement in statements:
+            cur.execute(statement)
+        cur.execute("""
+            INSERT INTO schema_migrations (version, name)
+            VALUES (%s, %s)
+        """, (version, name))
+        return True
+    return fn
+
+
+async def migrate(db):
+    """Apply every pending migration, returns the versions applied"""
+    applied = await db.run(_applied_versions)
+    done = []
+    for version, name, statements in MIGRATIONS:
+        if version in applied:
+            continue
+        if await db.run(_apply(version, name, statements)):
+            logger.info(f"Migration {version} applied: {name}")
+            done.append(version)
+    return done
+
+
+if __name__ == "__main__":
+    import asyncio
+    from dotenv import load_dotenv
+    from database import Database
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    async def run():
+        db = Database()
+        try:
+            versions = await migrate(db)
+            print(f"✅ Applied migrations: {versions or 'none pending'}")
+        finally:
+            await db.close()
+
+    asyncio.run(run())
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+MULTI-TENANT RUNNER
+Hosts every shared template bot from the deployments table in one process
+"""
+
+import os
+import hmac
+import asyncio
+import hashlib
+import logging
+
+from telegram.ext import Application, BaseUpdateProcessor
+
+from cluster import ClusterBus
+from database import Database
+from webhook import (
+    HTTPServer, allowed_updates_for, bounded_update_queue, health_route,
+    wait_for_stop_signal, webhook_route
+)
+from keyword_matcher import KeywordSet, db_loader
+from user_bot_template import build_application
+
+logger = logging.getLogger(__name__)
+
+
+class TenantUpdateProcessor(BaseUpdateProcessor):
+    """Caps one tenant's concurrency and draws from a slot pool shared by all.
+
+    asyncio.Semaphore wakes waiters in FIFO order, so a busy tenant queues
+    behind everyone else instead of starving them.
+    """
+
+    def __init__(self, max_concurrent_updates, shared_slots):
+        super().__init__(max_concurrent_updates)
+        self.shared_slots = shared_slots
+
+    async def do_process_update(self, update, coroutine):
+        async with self.shared_slots:
+            await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+class MultiTenantRunner:
+    """Runs one Application per shared deployment on a single event loop"""
+
+    def __init__(self, db, mode=None, max_per_tenant=None, max_total=None, sync_interval=None, bus=None):
+        self.db = db
+        self.bus = bus
+        self.mode = (mode or os.getenv("BOT_MODE", "polling")).lower()
+        self.max_per_tenant = int(max_per_tenant or os.getenv("TENANT_MAX_CONCURRENT", 4))
+        self.shared_slots = asyncio.Semaphore(int(max_total or os.getenv("TENANTS_MAX_CONCURRENT", 256)))
+        self.sync_interval = float(sync_interval or os.getenv("TENANT_SYNC_INTERVAL", 60))
+        self.queue_size = int(os.getenv("TENANT_QUEUE_SIZE", 100))
+        self.webhook_url = os.getenv("WEBHOOK_URL", "")
+        self.webhook_secret = os.getenv("WEBHOOK_SECRET", "")
+        if self.mode == "webhook" and not self.webhook_secret:
+            # Tenant routes are /tenant/<sequential id>: without per-tenant secrets anyone can post to them
+            raise ValueError("WEBHOOK_SECRET is required in webhook mode")
+        self.server = HTTPServer() if self.mode == "webhook" else None
+        self.tenants = {}
+        self._restarts = set()
+
+    # ==================== TENANTS ====================
+
+    async def load_tenants(self):
+        """Running shared deployments keyed by deployment id"""
+        rows = await self.db.fetchall("""
+            SELECT id, user_id, bot_token FROM deployments
+            WHERE hosting = 'shared' AND status = 'running'
+              AND bot_token IS NOT NULL AND NOT cancel_requested
+        """)
+        return {row['id']: row for row in rows}
+
+    def _secret_for(self, deployment_id):
+        return hmac.new(self.webhook_secret.encode(), str(deployment_id).encode(), hashlib.sha256).hexdigest()
+
+    def _build(self, row):
+        builder = (
+            Application.builder()
+            .update_queue(bounded_update_queue(self.queue_size))
+            .concurrent_updates(TenantUpdateProcessor(self.max_per_tenant, self.shared_slots))
+        )
+        if self.mode == "webhook":
+            builder = builder.updater(None)
+        keywords = KeywordSet(db_loader(self.db, row['user_id']))
+        application = build_application(row['bot_token'], row['user_id'], builder, keywords)
+
+        async def on_error(update, context):
+            logger.error(f"Tenant {row['id']} handler error: {context.error}")
+
+        application.add_error_handler(on_error)
+        return application
+
+    async def start_tenant(self, row):
+        """Start one tenant; a bad token only takes that tenant down"""
+        deployment_id = row['id']
+        application = self._build(row)
+        allowed = allowed_updates_for(application)
+        try:
+            await application.initialize()
+            await application.start()
+            if self.mode == "webhook":
+                path = f"/tenant/{deployment_id}"
+                secret = self._secret_for(deployment_id)
+                self.server.add_route(path, webhook_route(application, secret))
+                if self.webhook_url:
+                    await application.bot.set_webhook(
+                        self.webhook_url.rstrip("/") + path,
+                        allowed_updates=allowed,
+                        secret_token=secret
+                    )
+            else:
+                await application.updater.start_polling(allowed_updates=allowed)
+        except Exception as e:
+            logger.error(f"Tenant {deployment_id} failed to start: {e}")
+            await self._shutdown(deployment_id, application)
+            return False
+
+        self.tenants[deployment_id] = application
+        logger.info(f"Tenant {deployment_id} started for owner {row['user_id']}")
+        return True
+
+    async def stop_tenant(self, deployment_id):
+        application = self.tenants.pop(deployment_id, None)
+        if application is not None:
+            await self._shutdown(deployment_id, application)
+            logger.info(f"Tenant {deployment_id} stopped")
+
+    async def restart_tenant(self, deployment_id):
+        """Stop and start one tenant again (asked for by the health supervisor)"""
+        await self.stop_tenant(deployment_id)
+        row = (await self.load_tenants()).get(deployment_id)
+        if row is not None:
+            await self.start_tenant(row)
+
+    def _on_restart(self, payload):
+        task = asyncio.create_task(self.restart_tenant(int(payload)))
+        self._restarts.add(task)
+        task.add_done_callback(self._restarts.discard)
+
+    async def _shutdown(self, deployment_id, application):
+        if self.server is not None:
+            self.server.remove_route(f"/tenant/{deployment_id}")
+        try:
+            if application.updater and application.updater.running:
+                await application.updater.stop()
+            if application.running:
+                await application.stop()
+            await application.shutdown()
+        except Exception as e:
+            logger.error(f"Tenant {deployment_id} shutdown error: {e}")
+
+    async def sync(self):
+        """Start new deployments and stop removed ones"""
+        wanted = await self.load_tenants()
+        for deployment_id in set(self.tenants) - set(wanted):
+            await self.stop_tenant(deployment_id)
+        new = [row for deployment_id, row in wanted.items() if deployment_id not in self.tenants]
+        await asyncio.gather(*(self.start_tenant(row) for row in new))
+
+    # ==================== MAIN LOOP ====================
+
+    async def _sync_loop(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Tenant sync failed: {e}")
+            await asyncio.sleep(self.sync_interval)
+
+    async def run(self):
+        """Host tenants until SIGINT/SIGTERM"""
+        if self.server is not None:
+            self.server.add_route("/healthz", health_route)
+            await self.server.start()
+        if self.bus is not None:
+            self.bus.subscribe("tenant_restart", self._on_restart)
+            self.bus.start()
+        sync_task = asyncio.create_task(self._sync_loop())
+        try:
+            await wait_for_stop_signal()
+        finally:
+            sync_task.cancel()
+            if self.bus is not None:
+                await self.bus.stop()
+            await asyncio.gather(*(self.stop_tenant(i) for i in list(self.tenants)))
+            if self.server is not None:
+                await self.server.stop()
+
+
+async def main():
+    db = Database()
+    await db.connect()
+    try:
+        print("🤖 Multi-tenant runner started")
+        await MultiTenantRunner(db, bus=ClusterBus()).run()
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    asyncio.run(main())
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+ASYNC RAILWAY GRAPHQL CLIENT
+Pooled keep-alive connections, timeouts and backoff on 429/5xx
+
+Queries are retried on any transport error or 5xx. Mutations only when
+Railway cannot have run them: 429, or a connection that never opened.
+"""
+
+import os
+import random
+import asyncio
+import logging
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RAILWAY_API_URL = "https://backboard.railway.app/graphql/v2"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Rejected before the document was executed, safe to resend a mutation
+MUTATION_RETRY_STATUSES = {429}
+MUTATION_RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class RailwayError(Exception):
+    """GraphQL or HTTP error returned by the Railway API"""
+
+
+class RailwayClient:
+    """Shared async client for the Railway GraphQL API.
+
+    One instance keeps a pool of keep-alive connections; use it as an async
+    context manager or call close() when done.
+    """
+
+    def __init__(self, token=None, endpoint=None, timeout=None, max_retries=None, max_connections=None):
+        self.endpoint = endpoint or os.getenv("RAILWAY_API_URL", RAILWAY_API_URL)
+        self.max_retries = int(max_retries if max_retries is not None else os.getenv("RAILWAY_MAX_RETRIES", 4))
+        self.token = token or os.getenv('RAILWAY_TOKEN')
+        self.timeout = float(timeout or os.getenv("RAILWAY_TIMEOUT", 15))
+        self.max_connections = int(max_connections or os.getenv("RAILWAY_MAX_CONNECTIONS", 10))
+        self._http = None
+
+    @property
+    def http(self):
+        # Built on first use: loading the SSL context costs ~35ms of cold start
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                headers={
+                    "Authorization": f"Bearer {self.token}",
+                    "Content-Type": "application/json"
+                },
+                timeout=httpx.Timeout(self.timeout, connect=5.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._http
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    @staticmethod
+    def _backoff(attempt, retry_after=None):
+        if retry_after:
+            try:
+                return min(float(retry_after), 60.0)
+            except ValueError:
+                pass
+        return min(0.5 * 2 ** attempt, 10.0) * (0.5 + random.random() / 2)
+
+    async def execute(self, query, variables=None):
+        """Run one GraphQL document and return its data"""
+        # A read timeout or 5xx after Railway accepted a mutation would
+        # otherwise resend it and e.g. create a second service
+        is_mutation = query.lstrip().startswith("mutation")
+        retry_errors = MUTATION_RETRY_ERRORS if is_mutation else httpx.TransportError
+        retry_statuses = MUTATION_RETRY_STATUSES if is_mutation else RETRY_STATUSES
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.http.post(self.endpoint, json={"query": query, "variables": variables or {}})
+            except httpx.TransportError as e:
+                if attempt == self.max_retries or not isinstance(e, retry_errors):
+                    raise RailwayError(f"Railway API unreachable: {e}") from e
+                delay = self._backoff(attempt)
+                logger.warning(f"Railway API transport error, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                continue
+
+            if response.status_code in retry_statuses and attempt < self.max_retries:
+                delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                logger.warning(f"Railway API {response.status_code}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            if response.status_code >= 400:
+                raise RailwayError(f"Railway API HTTP {response.status_code}: {response.text[:200]}")
+
+            result = response.json()
+            if result.get("errors"):
+                raise RailwayError("; ".join(e.get("message", str(e)) for e in result["errors"]))
+            return result.get("data") or {}
+
+    # ==================== QUERIES ====================
+
+    async def find_service(self, project_id, name):
+        """Service called name in the project, or None"""
+        data = await self.execute("""
+            query ProjectServices($id: String!) {
+                project(id: $id) {
+                    services {
+                        edges {
+                            node {
+                                id
+                                name
+                            }
+                        }
+                    }
+                }
+            }
+        """, {"id": project_id})
+        edges = ((data.get("project") or {}).get("services") or {}).get("edges") or []
+        return next((e["node"] for e in edges if e["node"]["name"] == name), None)
+
+    # ==================== MUTATIONS ====================
+
+    async def upsert_variable(self, project_id, name, value):
+        data = await self.execute("""
+            mutation UpsertVariable($input: VariableUpsertInput!) {
+                variableUpsert(input: $input) {
+                    id
+                    name
+                    value
+                }
+            }
+        """, {"input": {"projectId": project_id, "name": name, "value": value}})
+        return data.get("variableUpsert")
+
+    async def create_service(self, service_input):
+        data = await self.execute("""
+            mutation ServiceInstanceCreate($input: ServiceInstanceCreateInput!) {
+                serviceInstanceCreate(input: $input) {
+                    id
+                    name
+                    createdAt
+                }
+            }
+        """, {"input": service_input})
+        return data.get("serviceInstanceCreate")
+
+    async def delete_service(self, service_id):
+        data = await self.execute("""
+            mutation ServiceDelete($id: String!) {
+                serviceDelete(id: $id)
+            }
+        """, {"id": service_id})
+        return data.get("serviceDelete")
+
+    async def redeploy_service(self, environment_id, service_id):
+        data = await self.execute("""
+            mutation ServiceInstanceRedeploy($environmentId: String!, $serviceId: String!) {
+                serviceInstanceRedeploy(environmentId: $environmentId, serviceId: $serviceId)
+            }
+        """, {"environmentId": environment_id, "serviceId": service_id})
+        return data.get("serviceInstanceRedeploy")
+
+    async def upsert_variable_and_create_service(self, variable_input, service_input):
+        """Both mutations in one request; GraphQL runs them in order"""
+        return await self.execute("""
+            mutation DeployBot($variable: VariableUpsertInput!, $service: ServiceInstanceCreateInput!) {
+                variableUpsert(input: $variable) {
+                    id
+                    name
+                    value
+                }
+                serviceInstanceCreate(input: $service) {
+                    id
+                    name
+                    createdAt
+                }
+            }
+        """, {"variable": variable_input, "service": service_input})
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+LOCAL RAILWAY API STUB
+Just enough of Railway's GraphQL API to run deploys without an account
+
+    python railway_stub.py --port 8710
+    RAILWAY_API_URL=http://127.0.0.1:8710/graphql/v2 python main_bot.py
+"""
+
+import json
+import uuid
+import asyncio
+import logging
+from collections import Counter, deque
+from datetime import datetime
+
+from webhook import HTTPServer
+
+logger = logging.getLogger(__name__)
+
+
+class RailwayStub:
+    """Answers the documents RailwayClient sends, keeping services in memory.
+
+    fail_next() queues HTTP errors for the coming requests and `delay`
+    holds every response back, so retry and timeout paths can be driven
+    deliberately: a delayed mutation is still applied, like a real
+    request whose response got lost.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8710, delay=0.0):
+        self.server = HTTPServer(host, port)
+        self.server.add_route("/graphql/v2", self.handle)
+        self.url = f"http://{host}:{port}/graphql/v2"
+        self.delay = delay
+        self.services = {}
+        self.variables = {}
+        self.calls = Counter()
+        self._failures = deque()
+
+    async def start(self):
+        await self.server.start()
+
+    async def stop(self):
+        await self.server.stop()
+
+    def fail_next(self, status=503, count=1):
+        self._failures.extend([status] * count)
+
+    def _apply(self, query, variables):
+        data = {}
+        if "variableUpsert" in query:
+            self.calls["variableUpsert"] += 1
+            value = variables.get("variable") or variables.get("input") or {}
+            self.variables[value.get("name")] = value.get("value")
+            data["variableUpsert"] = {"id": value.get("name"), "name": value.get("name"), "value": value.get("value")}
+        if "serviceInstanceCreate" in query:
+            self.calls["serviceInstanceCreate"] += 1
+            service = variables.get("service") or variables.get("input") or {}
+            node = {"id": str(uuid.uuid4()), "name": service.get("name"), "createdAt": datetime.utcnow().isoformat()}
+            self.services[node["id"]] = node
+            data["serviceInstanceCreate"] = node
+        if "serviceDelete" in query:
+            self.calls["serviceDelete"] += 1
+            data["serviceDelete"] = self.services.pop(variables.get("id"), None) is not None
+        if "serviceInstanceRedeploy" in query:
+            self.calls["serviceInstanceRedeploy"] += 1
+            data["serviceInstanceRedeploy"] = variables.get("serviceId") in self.services
+        if "project(" in query:
+            self.calls["project"] += 1
+            edges = [{"node": {"id": s["id"], "name": s["name"]}} for s in self.services.values()]
+            data["project"] = {"services": {"edges": edges}}
+        return data
+
+    async def handle(self, method, headers, body):
+        if method != "POST":
+            return 405, b"", "text/plain"
+        if self._failures:
+            return self._failures.popleft(), b"stub failure", "text/plain"
+        try:
+            request = json.loads(body)
+        except ValueError:
+            return 400, b"", "text/plain"
+        data = self._apply(request.get("query", ""), request.get("variables") or {})
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if not data:
+            payload = {"errors": [{"message": "Unsupported document in stub"}]}
+        else:
+            payload = {"data": data}
+        return 200, json.dumps(payload).encode(), "application/json"
+
+
+if __name__ == "__main__":
+    import argparse
+    from webhook import wait_for_stop_signal
+
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for Railway's GraphQL API")
+    parser.add_argument("--port", type=int, default=8710)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to hold every response")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    async def run():
+        stub = RailwayStub(port=args.port, delay=args.delay)
+        await stub.start()
+        print(f"🚂 Railway stub on {stub.url}")
+        try:
+            await wait_for_stop_signal()
+        finally:
+            await stub.stop()
+            print(f"Calls: {dict(stub.calls)}")
+
+    asyncio.run(run())
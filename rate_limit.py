@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+TOKEN BUCKET RATE LIMITING
+Shared budget for Telegram sends, globally and per chat
+"""
+
+import time
+import asyncio
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `capacity`.
+
+    acquire() waits for a token in FIFO order; pause() empties the bucket
+    for a while, e.g. when Telegram answers with RetryAfter.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available right now, without waiting"""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return False
+        self._refill(now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens=1):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        now = time.monotonic()
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0.0
+        self.updated = now
+
+
+class KeyedLimiter:
+    """One TokenBucket per key, least recently used keys are dropped"""
+
+    def __init__(self, rate, capacity=None, max_keys=10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def try_acquire(self, key, tokens=1):
+        return self.bucket(key).try_acquire(tokens)
+
+    async def acquire(self, key, tokens=1):
+        await self.bucket(key).acquire(tokens)
+
+    def __len__(self):
+        return len(self._buckets)
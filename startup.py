@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+COLD START TIMING
+Where a restart spends its time before the first update is answered
+
+Import this module before telegram/psycopg2 so their import cost is counted;
+interpreter start-up itself happens before any of our code runs.
+"""
+
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Runs before every other guard (the update type guard is -100)
+STARTUP_GROUP = -110
+
+
+class StartupTimer:
+    """Sequential phases plus background phases that overlap them"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.phases = {}
+        self.first_update = None
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def mark(self, phase):
+        """End a phase now; it began where the previous one ended"""
+        now = time.perf_counter()
+        self.phases[phase] = now - self.last
+        self.last = now
+
+    def track(self, phase, task):
+        """Time a background task from now until it finishes"""
+        started = time.perf_counter()
+        task.add_done_callback(lambda _: self.phases.__setitem__(phase, time.perf_counter() - started))
+
+    def report(self):
+        parts = ", ".join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in self.phases.items())
+        if self.first_update is None:
+            return f"Started in {self.elapsed():.2f}s ({parts})"
+        return f"First update reached the handlers {self.first_update:.2f}s after start ({parts})"
+
+    def install(self, application):
+        """Report the breakdown when the first update reaches the handlers"""
+        from telegram import Update
+        from telegram.ext import TypeHandler
+
+        # Left installed: removing a handler while updates are dispatched is unsafe
+        async def first_update(update, context):
+            if self.first_update is None:
+                self.first_update = self.elapsed()
+                print(f"⏱ {self.report()}")
+
+        application.add_handler(TypeHandler(Update, first_update), group=STARTUP_GROUP)
+
+
+STARTUP = StartupTimer()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+HOSTED BOT HEALTH SUPERVISOR
+Probes running bots in concurrent batches and restarts the ones that stall
+
+States: healthy | stalled | webhook_error | invalid_token | unreachable
+"""
+
+import os
+import time
+import asyncio
+import logging
+
+import httpx
+from psycopg2.extras import execute_values
+
+from cluster import CLUSTER_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+HEALTHY = 'healthy'
+STALLED = 'stalled'
+WEBHOOK_ERROR = 'webhook_error'
+INVALID_TOKEN = 'invalid_token'
+UNREACHABLE = 'unreachable'
+
+# States that count as the bot's fault and back off / restart
+FAILING = {STALLED, WEBHOOK_ERROR, INVALID_TOKEN}
+
+
+class ProbeError(Exception):
+    """Telegram answered a probe with an HTTP error"""
+
+
+class BotSupervisor:
+    """Claims due deployments in batches and probes them concurrently.
+
+    A probe is getMe (token valid, API latency) plus getWebhookInfo: a bot
+    that is not consuming its updates shows a growing pending_update_count
+    or a recent webhook delivery error. Failing bots are re-probed with
+    exponential backoff and restarted once after `restart_after` failures.
+    """
+
+    def __init__(self, db, deployer=None, notify=None, concurrency=None, batch_size=None, interval=None,
+                 retry_interval=None, max_backoff=None, stall_threshold=None, restart_after=None):
+        self.db = db
+        self.deployer = deployer
+        self.notify = notify
+        self.batch_size = int(batch_size or os.getenv("PROBE_BATCH_SIZE", 200))
+        self.interval = int(interval or os.getenv("PROBE_INTERVAL", 300))
+        self.retry_interval = int(retry_interval or os.getenv("PROBE_RETRY_INTERVAL", 60))
+        self.max_backoff = int(max_backoff or os.getenv("PROBE_MAX_BACKOFF", 3600))
+        self.stall_threshold = int(stall_threshold or os.getenv("PROBE_STALL_THRESHOLD", 20))
+        self.restart_after = int(restart_after or os.getenv("PROBE_RESTART_AFTER", 3))
+        self.api_url = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+        self.concurrency = int(concurrency or os.getenv("PROBE_CONCURRENCY", 20))
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._http = None
+        self.probes = 0
+        self.restarts = 0
+        self._task = None
+
+    @property
+    def http(self):
+        # Built on the first probe rather than at import
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(10.0, connect=5.0),
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            )
+        return self._http
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    # ==================== PROBING ====================
+
+    async def _call(self, token, method):
+        response = await self.http.post(f"{self.api_url}/bot{token}/{method}")
+        if response.status_code in (401, 404):
+            return None
+        if response.status_code >= 400:
+            raise ProbeError(f"{method}: HTTP {response.status_code} {response.reason_phrase}")
+        return response.json().get("result") or {}
+
+    async def probe(self, token):
+        """Returns (state, latency in ms, detail)"""
+        async with self._slots:
+            started = time.perf_counter()
+            try:
+                me = await self._call(token, "getMe")
+                latency = (time.perf_counter() - started) * 1000
+                if me is None:
+                    return INVALID_TOKEN, latency, "Token rejected by Telegram"
+                info = await self._call(token, "getWebhookInfo") or {}
+            # httpx messages carry the request URL, which holds the bot's token
+            except ProbeError as e:
+                return UNREACHABLE, None, str(e)
+            except httpx.HTTPError as e:
+                return UNREACHABLE, None, type(e).__name__
+            except ValueError:
+                return UNREACHABLE, None, "Invalid JSON from Telegram"
+
+        last_error = info.get("last_error_date") or 0
+        pending = info.get("pending_update_count") or 0
+        if info.get("url") and time.time() - last_error < 2 * self.interval:
+            return WEBHOOK_ERROR, latency, (info.get("last_error_message") or "")[:200]
+        if pending >= self.stall_threshold:
+            return STALLED, latency, f"{pending} updates waiting"
+        return HEALTHY, latency, None
+
+    # ==================== BATCHES ====================
+
+    async def claim(self):
+        """Lease a batch of running deployments that are due for a probe"""
+        return await self.db.fetchall("""
+            UPDATE deployments d
+            SET next_probe_at = NOW() + INTERVAL '5 minutes'
+            WHERE d.id IN (
+                SELECT id FROM deployments
+                WHERE status = 'running' AND bot_token IS NOT NULL
+                  AND (next_probe_at IS NULL OR next_probe_at <= NOW())
+                ORDER BY next_probe_at NULLS FIRST
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING d.id, d.user_id, d.bot_name, d.bot_token, d.hosting, d.service_id,
+                      d.health, d.probe_failures
+        """, (self.batch_size,))
+
+    def _next_probe(self, state, failures):
+        if state == HEALTHY:
+            return self.interval
+        if state == UNREACHABLE:
+            return self.retry_interval
+        return min(self.retry_interval * 2 ** (failures - 1), self.max_backoff)
+
+    async def record(self, results):
+        """Write a batch of probe results in one statement"""
+        def fn(cur):
+            execute_values(cur, """
+                UPDATE deployments d
+                SET health = v.health, probe_latency_ms = v.latency, health_detail = v.detail,
+                    probe_failures = v.failures, last_probe_at = NOW(),
+                    next_probe_at = NOW() + v.next_in * INTERVAL '1 second'
+                FROM (VALUES %s) AS v(id, health, latency, detail, failures, next_in)
+                WHERE d.id = v.id
+            """, results, template="(%s, %s, %s::real, %s, %s, %s)")
+        await self.db.run(fn)
+
+    async def restart(self, row):
+        """Restart a failing bot where it is hosted"""
+        if row['hosting'] == 'shared':
+            # The multi-tenant runner listens for this on the cluster channel
+            await self.db.execute("SELECT pg_notify(%s, %s)", (CLUSTER_CHANNEL, f"tenant_restart:{row['id']}"))
+        elif row['service_id'] and self.deployer is not None:
+            await self.deployer.restart(row['service_id'])
+        else:
+            return False
+        self.restarts += 1
+        logger.info(f"Restarted deployment {row['id']} after {self.restart_after} failed probes")
+        return True
+
+    async def run_once(self):
+        """Probe everything that is due, returns the number of bots probed"""
+        probed = 0
+        while True:
+            rows = await self.claim()
+            if not rows:
+                return probed
+            outcomes = await asyncio.gather(*(self.probe(row['bot_token']) for row in rows))
+
+            results = []
+            events = []
+            for row, (state, latency, detail) in zip(rows, outcomes):
+                failures = row['probe_failures'] + 1 if state in FAILING else 0
+                if state == UNREACHABLE:
+                    failures = row['probe_failures']
+                results.append((row['id'], state, latency, detail, failures, self._next_probe(state, failures)))
+                if state == INVALID_TOKEN and row['health'] != INVALID_TOKEN:
+                    events.append((row, state))
+                elif state in (STALLED, WEBHOOK_ERROR) and failures == self.restart_after:
+                    events.append((row, 'restarted' if await self._try_restart(row) else 'down'))
+            await self.record(results)
+
+            self.probes += len(rows)
+            probed += len(rows)
+            if self.notify is not None:
+                for row, event in events:
+                    try:
+                        await self.notify(row, event)
+                    except Exception as e:
+                        logger.error(f"Health notification for deployment {row['id']} failed: {e}")
+
+    async def _try_restart(self, row):
+        try:
+            return await self.restart(row)
+        except Exception as e:
+            logger.error(f"Restarting deployment {row['id']} failed: {e}")
+            return False
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Health supervisor failed: {e}")
+            await asyncio.sleep(self.retry_interval)
+
+    def stats(self):
+        return {'probes': self.probes, 'restarts': self.restarts}
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
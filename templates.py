@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+PRE-RENDERED MESSAGE TEMPLATES
+Message text and keyboards built once at startup, checked before the first update
+"""
+
+import string
+
+from telegram import InlineKeyboardMarkup
+from telegram.helpers import escape_markdown
+
+
+class TemplateError(ValueError):
+    """Template text is not valid for its parse mode"""
+
+
+class _KeepMissing(dict):
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+def check_markdown(text):
+    """Raise TemplateError where Telegram's legacy Markdown parser would.
+
+    Entities can't nest, so the only state is the one open entity: *bold*,
+    _italic_, `code`, ```pre``` or a [link](url).
+    """
+    i = 0
+    opened = None
+    opened_at = 0
+    while i < len(text):
+        char = text[i]
+        if opened in ("`", "```"):
+            if text.startswith(opened, i):
+                i += len(opened)
+                opened = None
+                continue
+        elif char == "\\":
+            i += 2
+            continue
+        elif opened is None and text.startswith("```", i):
+            opened, opened_at = "```", i
+            i += 3
+            continue
+        elif opened is None and char in "*_`":
+            opened, opened_at = char, i
+        elif opened is None and char == "[":
+            close = text.find("](", i)
+            end = text.find(")", close + 2) if close != -1 else -1
+            if close == -1 or end == -1:
+                raise TemplateError(f"Unclosed link at offset {i}: {text[i:i + 30]!r}")
+            i = end + 1
+            continue
+        elif char == opened:
+            opened = None
+        i += 1
+    if opened is not None:
+        raise TemplateError(f"Unclosed {opened!r} at offset {opened_at}: {text[opened_at:opened_at + 30]!r}")
+
+
+class Template:
+    """One message: text with {fields}, an optional keyboard and parse mode.
+
+    Fields given as constants are substituted once when the template is
+    made; a template left without fields is rendered once and reused.
+    Values for fields listed in `escape` are Markdown-escaped on render
+    (user names may contain * or _).
+    """
+
+    def __init__(self, name, text, keyboard=None, parse_mode='Markdown', constants=None, escape=()):
+        self.name = name
+        self.parse_mode = parse_mode
+        self.text = text.format_map(_KeepMissing(constants or {})) if constants else text
+        self.fields = {f for _, f, _, _ in string.Formatter().parse(self.text) if f}
+        self.escape = set(escape)
+        if isinstance(keyboard, list):
+            keyboard = InlineKeyboardMarkup(keyboard)
+        self.keyboard = keyboard
+
+        # Validate with stand-in values, so a bad template fails at startup
+        sample = self.text.format_map({field: "x" for field in self.fields})
+        if parse_mode == 'Markdown':
+            try:
+                check_markdown(sample)
+            except TemplateError as e:
+                raise TemplateError(f"Template {name!r}: {e}") from None
+        self._rendered = None if self.fields else sample
+
+    def render(self, **fields):
+        """Text for these field values"""
+        if self._rendered is not None:
+            return self._rendered
+        missing = self.fields - fields.keys()
+        if missing:
+            raise KeyError(f"Template {self.name!r} is missing {', '.join(sorted(missing))}")
+        for field in self.escape:
+            fields[field] = escape_markdown(str(fields[field]))
+        return self.text.format_map(fields)
+
+    def kwargs(self, reply_markup=None, **fields):
+        """Keyword arguments for reply_text / edit_message_text"""
+        return {
+            'text': self.render(**fields),
+            'reply_markup': reply_markup or self.keyboard,
+            'parse_mode': self.parse_mode
+        }
+
+
+class TemplateRegistry:
+    """Named templates sharing a set of constants (admin contact etc.)"""
+
+    def __init__(self, constants=None):
+        self.constants = dict(constants or {})
+        self.templates = {}
+
+    def add(self, name, text, keyboard=None, parse_mode='Markdown', escape=()):
+        if name in self.templates:
+            raise TemplateError(f"Duplicate template {name!r}")
+        template = Template(name, text, keyboard, parse_mode, self.constants, escape)
+        self.templates[name] = template
+        return template
+
+    def __getitem__(self, name):
+        return self.templates[name]
+
+    def __len__(self):
+        return len(self.templates)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+BUILD CACHE TESTS
+Requirement normalization and the lines refused before pip sees them
+"""
+
+import pytest
+
+from build_cache import normalize_requirements, requirements_hash, InvalidRequirements
+
+
+def test_normalize_requirements_is_canonical():
+    a = normalize_requirements("Requests >= 2.0\n# comment\npython_telegram_bot[Socks,http2]==20.7  # pinned\n")
+    b = normalize_requirements("python-telegram-bot[http2,socks]==20.7\n\nrequests>=2.0\n")
+    assert a == b == ["python-telegram-bot[http2,socks]==20.7", "requests>=2.0"]
+    assert requirements_hash(a) == requirements_hash(b)
+
+
+def test_normalize_requirements_keeps_markers():
+    lines = normalize_requirements('uvloop; sys_platform != "win32"')
+    assert lines == ['uvloop; sys_platform != "win32"']
+
+
+@pytest.mark.parametrize("line", [
+    "-e git+https://example.com/evil.git",
+    "--index-url https://evil.example/simple",
+    "-r other.txt",
+    "https://example.com/pkg.tar.gz",
+    "pkg @ file:///etc/passwd",
+    "./local_dir",
+    "pkg; os.system('x')",
+])
+def test_normalize_requirements_rejects(line):
+    with pytest.raises(InvalidRequirements):
+        normalize_requirements("requests\n" + line)
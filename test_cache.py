@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+USER CACHE TESTS
+TTLCache generations: a row read before an invalidation is not cached
+"""
+
+from cache import TTLCache
+
+
+def test_cache_refuses_value_read_before_invalidate():
+    cache = TTLCache(maxsize=10)
+    generation = cache.generation("user")
+    cache.invalidate("user")
+    assert not cache.set("user", "stale", generation)
+    assert "user" not in cache
+    assert cache.set("user", "fresh", cache.generation("user"))
+    assert cache.get("user") == "fresh"
+
+
+def test_cache_generation_survives_eviction():
+    cache = TTLCache(maxsize=2)
+    generation = cache.generation("a")
+    cache.invalidate("a")
+    for key in "bcd":
+        cache.invalidate(key)
+    # "a"'s counter was evicted; the epoch still tells the tokens apart
+    assert not cache.set("a", "stale", generation)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+CALLBACK ROUTER TESTS
+Dispatch, payload parsing and per-route metrics with a fake query
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from callback_router import CallbackRouter, UNKNOWN_ROUTE
+
+
+class FakeQuery:
+    def __init__(self, data):
+        self.data = data
+        self.answers = []
+
+    async def answer(self, text=None):
+        self.answers.append(text)
+
+
+def press(router, data):
+    query = FakeQuery(data)
+    asyncio.run(router.dispatch(SimpleNamespace(callback_query=query), None))
+    return query
+
+
+def test_router_dispatches_with_parsed_payload():
+    router = CallbackRouter()
+    seen = []
+
+    async def handler(update, context, payload):
+        seen.append(payload)
+
+    router.add("deploy_cancel", handler, parse=int)
+    router.add("admin_panel", handler)
+    query = press(router, "deploy_cancel:42")
+    press(router, "admin_panel")
+
+    assert seen == [42, None]
+    assert query.answers == [None]
+    assert router.stats()["deploy_cancel"]["calls"] == 1
+
+
+def test_router_rejects_bad_payload_and_unknown_action():
+    router = CallbackRouter()
+
+    async def handler(update, context, payload):
+        raise AssertionError("must not run")
+
+    router.add("deploy_cancel", handler, parse=int)
+    assert press(router, "deploy_cancel:abc").answers == ["⚠️ Invalid button"]
+    assert press(router, "nope").answers == [router.not_found_text]
+    assert router.metrics["deploy_cancel"]["errors"] == 1
+    assert router.metrics[UNKNOWN_ROUTE]["calls"] == 1
+
+
+def test_router_counts_handler_errors():
+    router = CallbackRouter()
+
+    async def handler(update, context, payload):
+        raise RuntimeError("boom")
+
+    router.add("broken", handler)
+    press(router, "broken")
+    assert router.metrics["broken"]["errors"] == 1
+    with pytest.raises(ValueError):
+        router.add("broken", handler)
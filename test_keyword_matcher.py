@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+KEYWORD MATCHER TESTS
+The automaton against a brute-force scan, and KeywordSet hot reloading
+"""
+
+import json
+import random
+import asyncio
+
+import pytest
+
+import keyword_matcher
+from keyword_matcher import DEFAULT_RULES, KeywordMatcher, KeywordSet, Rule, _is_word_char, file_loader
+
+
+# ==================== MATCHER ====================
+
+def brute_force_match(rules, text):
+    """The old scan: every rule against every offset"""
+    text = text.lower()
+    best = None
+    for index, rule in enumerate(rules):
+        keyword = rule.keyword.lower()
+        if not keyword:
+            continue
+        start = text.find(keyword)
+        while start != -1:
+            end = start + len(keyword)
+            if not rule.whole_word or (
+                    (start == 0 or not _is_word_char(text[start - 1]))
+                    and (end == len(text) or not _is_word_char(text[end]))):
+                if best is None or rule.priority > rules[best].priority:
+                    best = index
+                break
+            start = text.find(keyword, start + 1)
+    return rules[best] if best is not None else None
+
+
+def test_matcher_agrees_with_brute_force():
+    rng = random.Random(1234)
+    alphabet = "ab c_"
+    for _ in range(300):
+        rules = [
+            Rule("".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))),
+                 f"reply {i}", rng.randint(0, 2), rng.random() < 0.5)
+            for i in range(rng.randint(1, 6))
+        ]
+        matcher = KeywordMatcher(rules)
+        for _ in range(20):
+            text = "".join(rng.choice(alphabet + "AB") for _ in range(rng.randint(0, 15)))
+            expected = brute_force_match(rules, text)
+            got = matcher.match(text)
+            assert (got and got.reply) == (expected and expected.reply), (rules, text)
+
+
+def test_matcher_priority_and_ties():
+    matcher = KeywordMatcher([
+        Rule("hi", "first", 0, False),
+        Rule("hi", "second", 0, False),
+        Rule("there", "urgent", 5, False),
+    ])
+    assert matcher.match("Hi").reply == "first"
+    assert matcher.match("hi THERE").reply == "urgent"
+    assert matcher.match("hello") is None
+
+
+def test_matcher_whole_word():
+    matcher = KeywordMatcher([Rule("bot", "bot", 0, True)])
+    assert matcher.match("my bot!").reply == "bot"
+    assert matcher.match("robots") is None
+    assert matcher.match("bot_name") is None
+
+
+def test_matcher_skips_empty_keywords():
+    matcher = KeywordMatcher([Rule("", "empty", 0, False), Rule("x", "x", 0, False)])
+    assert len(matcher) == 1
+    assert matcher.match("abc") is None
+
+
+# ==================== HOT RELOAD ====================
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(keyword_matcher.time, "monotonic", lambda: now[0])
+    return now
+
+
+class FakeLoader:
+    def __init__(self, rules):
+        self.rules = rules
+        self.calls = 0
+        self.error = None
+
+    async def __call__(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.rules
+
+
+def test_keyword_set_reloads_after_interval(clock):
+    async def scenario():
+        loader = FakeLoader([Rule("hi", "old", 0, False)])
+        keywords = KeywordSet(loader, reload_interval=30)
+        first = await keywords.get()
+        assert first.match("hi").reply == "old"
+
+        loader.rules = [Rule("hi", "new", 0, False)]
+        assert await keywords.get() is first
+        clock[0] += 30
+        assert (await keywords.get()).match("hi").reply == "new"
+        assert loader.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_keyword_set_keeps_automaton_when_rules_unchanged(clock):
+    async def scenario():
+        keywords = KeywordSet(FakeLoader([Rule("hi", "same", 0, False)]), reload_interval=30)
+        first = await keywords.get()
+        clock[0] += 30
+        assert await keywords.get() is first
+
+    asyncio.run(scenario())
+
+
+def test_keyword_set_serves_previous_rules_when_reload_fails(clock):
+    async def scenario():
+        loader = FakeLoader([Rule("hi", "kept", 0, False)])
+        keywords = KeywordSet(loader, reload_interval=30)
+        await keywords.get()
+        loader.error = RuntimeError("database down")
+        clock[0] += 30
+        assert (await keywords.get()).match("hi").reply == "kept"
+
+        empty = KeywordSet(loader, reload_interval=30)
+        with pytest.raises(RuntimeError):
+            await empty.get()
+
+    asyncio.run(scenario())
+
+
+def test_file_loader(tmp_path):
+    path = tmp_path / "keywords.json"
+    path.write_text(json.dumps([{"keyword": "Price", "reply": "5$", "priority": "2", "whole_word": 1}]))
+    assert asyncio.run(file_loader(str(path))()) == [Rule("Price", "5$", 2, True)]
+    assert asyncio.run(file_loader(str(tmp_path / "missing.json"))()) == DEFAULT_RULES
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+RATE LIMIT TESTS
+TokenBucket refill and pause on a fake clock
+"""
+
+import pytest
+
+import rate_limit
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_token_bucket_refills_up_to_capacity(clock):
+    bucket = rate_limit.TokenBucket(rate=2, capacity=3)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    clock[0] += 0.5
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    clock[0] += 100
+    assert bucket.try_acquire(3)
+    assert not bucket.try_acquire()
+
+
+def test_token_bucket_pause(clock):
+    bucket = rate_limit.TokenBucket(rate=10)
+    bucket.pause(5)
+    assert not bucket.try_acquire()
+    clock[0] += 5
+    assert bucket.try_acquire()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+TEMPLATE TESTS
+check_markdown against what Telegram's legacy Markdown parser accepts
+"""
+
+import pytest
+
+from templates import check_markdown, TemplateError
+
+
+@pytest.mark.parametrize("text", [
+    "plain text",
+    "*bold* and _italic_ and `code`",
+    "```\npre with * and _ inside\n```",
+    "`snake_case` stays code",
+    "[link](https://example.com) then *bold*",
+    r"escaped \* star",
+])
+def test_check_markdown_accepts(text):
+    check_markdown(text)
+
+
+@pytest.mark.parametrize("text", [
+    "*unclosed bold",
+    "user_name",
+    "```never closed",
+    "[broken link](https://example.com",
+    "[no url]",
+])
+def test_check_markdown_rejects(text):
+    with pytest.raises(TemplateError):
+        check_markdown(text)
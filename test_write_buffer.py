@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+WRITE-BEHIND BUFFER TESTS
+UserWriteBuffer against a fake database, no Postgres needed
+"""
+
+import asyncio
+
+import pytest
+
+from cache import TTLCache
+from database import UserWriteBuffer
+
+
+class FakeDB:
+    """Stands in for Database: run() can be held open or made to fail"""
+
+    def __init__(self):
+        self.user_cache = TTLCache()
+        self.committed = []
+        self.fail = 0
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def run(self, fn):
+        self.started.set()
+        await self.release.wait()
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("connection lost")
+        self.committed.append(fn)
+
+
+def test_flush_if_pending_waits_for_inflight_flush():
+    async def scenario():
+        db = FakeDB()
+        buffer = UserWriteBuffer(db, flush_ms=1000, max_rows=100)
+        buffer.add(1, "alice", "Alice")
+        db.release.clear()
+        first = asyncio.create_task(buffer.flush())
+        await db.started.wait()
+
+        # The row has left _pending but is not committed yet
+        assert buffer.pending(1) is not None
+        second = asyncio.create_task(buffer.flush_if_pending(1))
+        await asyncio.sleep(0.01)
+        assert not second.done()
+
+        db.release.set()
+        assert await first == 1
+        await second
+        assert len(db.committed) == 1
+        assert buffer.pending(1) is None
+
+    asyncio.run(scenario())
+
+
+def test_failed_flush_is_retried_by_flush_if_pending():
+    async def scenario():
+        db = FakeDB()
+        buffer = UserWriteBuffer(db, flush_ms=1000, max_rows=100)
+        buffer.add(1, "alice", "Alice")
+        db.fail = 1
+        with pytest.raises(RuntimeError):
+            await buffer.flush()
+        assert buffer.pending(1)["username"] == "alice"
+
+        await buffer.flush_if_pending(1)
+        assert len(db.committed) == 1
+        assert buffer.metrics['flush_errors'] == 1
+        assert buffer.pending(1) is None
+
+    asyncio.run(scenario())
+
+
+def test_write_buffer_merges_rows():
+    async def scenario():
+        buffer = UserWriteBuffer(FakeDB(), flush_ms=1000, max_rows=100)
+        buffer.add(1, "old", "Alice")
+        row = buffer.add(1, "new", "Ignored")
+        assert row['username'] == "new" and row['first_name'] == "Alice"
+        assert await buffer.flush() == 1
+
+    asyncio.run(scenario())
+
+
+def test_flush_invalidates_cached_user():
+    async def scenario():
+        db = FakeDB()
+        buffer = UserWriteBuffer(db, flush_ms=1000, max_rows=100)
+        db.user_cache.set(1, {'username': 'stale'})
+        buffer.add(1, "fresh", "Alice")
+        await buffer.flush()
+        assert 1 not in db.user_cache
+
+    asyncio.run(scenario())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+STREAMING UPLOAD STORE
+Streams user files from Telegram to content-addressed storage on disk
+"""
+
+import os
+import asyncio
+import hashlib
+import logging
+import tempfile
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Files a deployment needs before it can be queued
+REQUIRED_FILES = ("bot.py", "requirements.txt")
+
+
+class UploadTooLarge(Exception):
+    """File is over the configured size limit"""
+
+
+class UploadFailed(Exception):
+    """Download from Telegram failed (message never includes the file URL)"""
+
+
+class UploadStore:
+    """Content-addressed file store fed by chunked downloads.
+
+    Files never sit in memory as a whole: each chunk is hashed and written
+    as it arrives, and identical content is stored once under its sha256.
+    """
+
+    def __init__(self, root=None, max_bytes=None, chunk_size=64 * 1024, max_concurrent=None):
+        self.root = root or os.getenv("UPLOAD_DIR", "uploads")
+        self.max_bytes = int(max_bytes or os.getenv("UPLOAD_MAX_BYTES", 1024 * 1024))
+        self.chunk_size = chunk_size
+        self._slots = asyncio.Semaphore(int(max_concurrent or os.getenv("UPLOAD_MAX_CONCURRENT", 16)))
+        self._http = None
+        os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+
+    @property
+    def http(self):
+        # Built on first upload rather than at import
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=5.0))
+        return self._http
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def path_for(self, sha256):
+        return os.path.join(self.root, "objects", sha256[:2], sha256)
+
+    async def save(self, url, declared_size=None):
+        """Download url into the store, returns (sha256, size, deduplicated)"""
+        if declared_size and declared_size > self.max_bytes:
+            raise UploadTooLarge(declared_size)
+
+        async with self._slots:
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                with os.fdopen(fd, "wb") as tmp:
+                    try:
+                        async with self.http.stream("GET", url) as response:
+                            response.raise_for_status()
+                            async for chunk in response.aiter_bytes(self.chunk_size):
+                                size += len(chunk)
+                                if size > self.max_bytes:
+                                    raise UploadTooLarge(size)
+                                digest.update(chunk)
+                                await asyncio.to_thread(tmp.write, chunk)
+                    # File URLs contain the bot token, and httpx puts the URL in its messages
+                    except httpx.HTTPStatusError as e:
+                        raise UploadFailed(f"HTTP {e.response.status_code}") from None
+                    except httpx.HTTPError as e:
+                        raise UploadFailed(type(e).__name__) from None
+
+                sha256 = digest.hexdigest()
+                target = self.path_for(sha256)
+                if os.path.exists(target):
+                    os.remove(tmp_path)
+                    return sha256, size, True
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp_path, target)
+                return sha256, size, False
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
@@ -5,6 +5,10 @@ USER BOT TEMPLATE - Deployed on Railway for each user
 
 import os
 import logging
+
+# First, so the telegram import below counts as start-up time
+from startup import STARTUP
+
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application, CommandHandler, CallbackQueryHandler,
@@ -12,9 +16,13 @@ from telegram.ext import (
 )
 from datetime import datetime
 
+from keyword_matcher import KeywordSet, file_loader
+from webhook import bounded_update_queue, restrict_update_types, run_application
+
 # Configuration
 BOT_TOKEN = os.getenv("BOT_TOKEN")
-OWNER_ID = int(os.getenv("OWNER_ID"))
+OWNER_ID = int(os.getenv("OWNER_ID", 0))
+KEYWORDS_FILE = os.getenv("KEYWORDS_FILE", "keywords.json")
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -88,38 +96,51 @@ async def inline_button_handler(update: Update, context: ContextTypes.DEFAULT_TY
 
 async def keyword_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Auto reply to keywords"""
-    message_text = update.message.text.lower()
+    matcher = await context.bot_data['keywords'].get()
+    reply = matcher.reply_for(update.effective_message.text)
     
-    keywords = {
-        "hello": "👋 Hello! How can I help you?",
-        "hi": "👋 Hi there!",
-        "price": "💰 Check /premium for pricing",
-        "help": "🆘 Need help? Contact @CyperXploit",
-        "bot": "🤖 I'm a premium bot hosted on Railway!",
-        "time": f"⏰ Current time: {datetime.now().strftime('%H:%M:%S')}"
-    }
+    if reply:
+        await update.effective_message.reply_text(reply)
+
+async def reload_keywords(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Owner only - pick up keyword changes immediately"""
+    if update.effective_user.id != context.bot_data['owner_id']:
+        return
     
-    for keyword, reply in keywords.items():
-        if keyword in message_text:
-            await update.message.reply_text(reply)
-            break
+    matcher = await context.bot_data['keywords'].reload()
+    await update.message.reply_text(f"✅ {len(matcher)} keywords loaded")
 
-def main():
-    """Start user bot"""
-    application = Application.builder().token(BOT_TOKEN).build()
+async def show_my_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Reply with the sender's Telegram ID"""
+    await update.message.reply_text(f"Your ID: `{update.effective_user.id}`", parse_mode='Markdown')
+
+def build_application(token, owner_id, builder=None, keywords=None):
+    """Create a user bot Application with all template handlers"""
+    builder = builder or Application.builder().update_queue(bounded_update_queue())
+    application = builder.token(token).build()
+    application.bot_data['owner_id'] = owner_id
+    application.bot_data['keywords'] = keywords or KeywordSet(file_loader(KEYWORDS_FILE))
     
     # Add handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", start))
-    application.add_handler(CommandHandler("myid", 
-        lambda u, c: u.message.reply_text(f"Your ID: `{u.effective_user.id}`", parse_mode='Markdown')))
+    application.add_handler(CommandHandler("myid", show_my_id))
+    application.add_handler(CommandHandler("reload", reload_keywords))
     
     application.add_handler(CallbackQueryHandler(inline_button_handler))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, keyword_reply))
+    return application
+
+def main():
+    """Start user bot"""
+    STARTUP.mark("imports")
+    application = build_application(BOT_TOKEN, OWNER_ID)
+    STARTUP.mark("handlers")
+    STARTUP.install(application)
     
     # Start bot
     print(f"🤖 User Bot Started for Owner: {OWNER_ID}")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    run_application(application, allowed_updates=restrict_update_types(application))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+WEBHOOK SERVING MODE
+Small asyncio HTTP endpoint that pushes Telegram updates into Applications
+"""
+
+import os
+import hmac
+import json
+import time
+import signal
+import asyncio
+import logging
+import secrets
+
+import httpx
+from telegram import Update
+from telegram.ext import (
+    ApplicationHandlerStop, CallbackQueryHandler, ChatJoinRequestHandler,
+    ChatMemberHandler, ChosenInlineResultHandler, CommandHandler,
+    ConversationHandler, InlineQueryHandler, MessageHandler, PollAnswerHandler,
+    PollHandler, PreCheckoutQueryHandler, ShippingQueryHandler, TypeHandler
+)
+
+logger = logging.getLogger(__name__)
+
+# Runs before every other handler group
+UPDATE_GUARD_GROUP = -100
+
+# Update fields each handler class can match (CommandHandler's default
+# filter is UpdateType.MESSAGES, message filters accept channel posts too)
+MESSAGE_TYPES = [Update.MESSAGE, Update.EDITED_MESSAGE]
+EFFECTIVE_MESSAGE_TYPES = MESSAGE_TYPES + [Update.CHANNEL_POST, Update.EDITED_CHANNEL_POST]
+HANDLER_UPDATE_TYPES = {
+    CommandHandler: MESSAGE_TYPES,
+    MessageHandler: EFFECTIVE_MESSAGE_TYPES,
+    CallbackQueryHandler: [Update.CALLBACK_QUERY],
+    InlineQueryHandler: [Update.INLINE_QUERY],
+    ChosenInlineResultHandler: [Update.CHOSEN_INLINE_RESULT],
+    ShippingQueryHandler: [Update.SHIPPING_QUERY],
+    PreCheckoutQueryHandler: [Update.PRE_CHECKOUT_QUERY],
+    PollHandler: [Update.POLL],
+    PollAnswerHandler: [Update.POLL_ANSWER],
+    ChatJoinRequestHandler: [Update.CHAT_JOIN_REQUEST]
+}
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+MAX_BODY_SIZE = 1024 * 1024
+MAX_HEADERS = 100
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    503: "Service Unavailable"
+}
+
+
+def bounded_update_queue(maxsize=None):
+    """Update queue for ApplicationBuilder.update_queue()"""
+    return asyncio.Queue(maxsize=int(maxsize or os.getenv("WEBHOOK_QUEUE_SIZE", 1000)))
+
+
+class HTTPServer:
+    """Minimal HTTP/1.1 server with keep-alive.
+
+    Route handlers are called as handler(method, headers, body) and return
+    (status, body bytes, content type). Idle keep-alive connections are
+    closed after idle_timeout, and a request whose headers and body don't
+    arrive within read_timeout is dropped.
+    """
+
+    def __init__(self, host=None, port=None, idle_timeout=None, read_timeout=None):
+        self.host = host or os.getenv("WEBHOOK_HOST", "0.0.0.0")
+        self.port = int(port or os.getenv("PORT", 8443))
+        self.idle_timeout = float(idle_timeout or os.getenv("WEBHOOK_IDLE_TIMEOUT", 75))
+        self.read_timeout = float(read_timeout or os.getenv("WEBHOOK_READ_TIMEOUT", 10))
+        self.routes = {}
+        self._server = None
+        # Open connections: serving task -> writer
+        self._connections = {}
+
+    def add_route(self, path, handler):
+        self.routes[path] = handler
+
+    def remove_route(self, path):
+        self.routes.pop(path, None)
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        logger.info(f"HTTP server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            # Closing the transport ends a waiting keep-alive read with EOF;
+            # cancelling the task instead gets logged as an unhandled error
+            for writer in self._connections.values():
+                writer.close()
+            await asyncio.gather(*list(self._connections), return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    @staticmethod
+    async def _read_headers(reader):
+        headers = {}
+        for _ in range(MAX_HEADERS + 1):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        raise ValueError("Too many headers")
+
+    async def _serve(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                # ValueError: malformed request line or Content-Length, or a line over the stream limit
+                try:
+                    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                    headers = await asyncio.wait_for(self._read_headers(reader), self.read_timeout)
+                    length = int(headers.get("content-length") or 0)
+                    if length < 0:
+                        raise ValueError(f"Negative Content-Length {length}")
+                except ValueError:
+                    await self._respond(writer, 400, b"", keep_alive=False)
+                    break
+                except asyncio.TimeoutError:
+                    break
+                if length > MAX_BODY_SIZE:
+                    await self._respond(writer, 413, b"", keep_alive=False)
+                    break
+                try:
+                    body = await asyncio.wait_for(reader.readexactly(length), self.read_timeout) if length else b""
+                except asyncio.TimeoutError:
+                    break
+
+                handler = self.routes.get(target.split("?", 1)[0])
+                if handler is None:
+                    status, payload, content_type = 404, b"", "text/plain"
+                else:
+                    try:
+                        status, payload, content_type = await handler(method, headers, body)
+                    except Exception:
+                        logger.exception(f"HTTP handler for {target} failed")
+                        status, payload, content_type = 503, b"", "text/plain"
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, payload, content_type, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, body, content_type="text/plain", keep_alive=True):
+        head = (
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'OK')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+def webhook_route(application, secret_token):
+    """HTTP route that verifies the secret and queues the update"""
+    if not secret_token:
+        # Bot ids are public: without a secret anyone could post updates "from" the admin
+        raise ValueError("A webhook route needs a secret token")
+
+    async def handle(method, headers, body):
+        if method != "POST":
+            return 405, b"", "text/plain"
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, ""), secret_token):
+            return 403, b"", "text/plain"
+        try:
+            update = Update.de_json(json.loads(body), application.bot)
+        except (ValueError, TypeError):
+            return 400, b"", "text/plain"
+        try:
+            application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Telegram redelivers on non-2xx, so shedding here loses nothing
+            logger.warning("Update queue full, asking Telegram to retry")
+            return 503, b"", "text/plain"
+        return 200, b"", "text/plain"
+    return handle
+
+
+async def health_route(method, headers, body):
+    return 200, b"ok", "text/plain"
+
+
+async def wait_for_stop_signal():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+    await stop.wait()
+
+
+async def run_webhook(application, allowed_updates=None, url=None, secret_token=None, path=None, server=None):
+    """Serve application from a webhook until SIGINT/SIGTERM"""
+    url = url if url is not None else os.getenv("WEBHOOK_URL", "")
+    secret_token = secret_token or os.getenv("WEBHOOK_SECRET") or None
+    if not secret_token:
+        if not url:
+            raise ValueError("WEBHOOK_SECRET is required when WEBHOOK_URL is not set")
+        # Only Telegram needs to know it, and it's registered below
+        secret_token = secrets.token_urlsafe(32)
+        logger.info("WEBHOOK_SECRET not set, registering a random secret token")
+    path = path or f"/bot/{application.bot.token.split(':')[0]}"
+
+    server = server or HTTPServer()
+    server.add_route(path, webhook_route(application, secret_token))
+    server.add_route("/healthz", health_route)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    await server.start()
+    try:
+        if url:
+            await application.bot.set_webhook(
+                url.rstrip("/") + path,
+                allowed_updates=allowed_updates,
+                secret_token=secret_token,
+                max_connections=int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))
+            )
+        else:
+            # Local mode: updates are pushed by whoever holds the secret (ingress, WebhookSender)
+            logger.info(f"WEBHOOK_URL not set, accepting updates on {path} without registering")
+        await wait_for_stop_signal()
+    finally:
+        await server.stop()
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+class WebhookSender:
+    """Plays Telegram's side of webhook mode against a local endpoint.
+
+    Posts update JSON with the secret header the way Telegram does, for
+    tests and for poking a local bot by hand. Returns the HTTP status.
+    """
+
+    def __init__(self, url, secret_token=None):
+        self.url = url
+        self.secret_token = secret_token
+        self.update_id = 0
+        self.http = httpx.AsyncClient(timeout=10.0)
+
+    async def close(self):
+        await self.http.aclose()
+
+    async def send(self, update):
+        if "update_id" not in update:
+            self.update_id += 1
+            update = {"update_id": self.update_id, **update}
+        headers = {SECRET_HEADER: self.secret_token} if self.secret_token else {}
+        response = await self.http.post(self.url, json=update, headers=headers)
+        return response.status_code
+
+    @staticmethod
+    def message(user_id, text, first_name="Test"):
+        """A private-chat text message update"""
+        user = {"id": user_id, "is_bot": False, "first_name": first_name}
+        return {"message": {
+            "message_id": 1,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": first_name},
+            "from": user,
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+            if text.startswith("/") else []
+        }}
+
+
+def _handler_update_types(handler):
+    if isinstance(handler, ConversationHandler):
+        nested = handler.entry_points + handler.fallbacks
+        for state_handlers in handler.states.values():
+            nested += state_handlers
+        return set().union(*(_handler_update_types(h) for h in nested))
+    if isinstance(handler, ChatMemberHandler):
+        return {
+            ChatMemberHandler.MY_CHAT_MEMBER: {Update.MY_CHAT_MEMBER},
+            ChatMemberHandler.CHAT_MEMBER: {Update.CHAT_MEMBER}
+        }.get(handler.chat_member_types, {Update.MY_CHAT_MEMBER, Update.CHAT_MEMBER})
+    if isinstance(handler, TypeHandler) and issubclass(handler.type, Update):
+        return set(Update.ALL_TYPES)
+    for handler_class, types in HANDLER_UPDATE_TYPES.items():
+        if isinstance(handler, handler_class):
+            return set(types)
+    # Unknown handler: can't tell, so don't narrow
+    return set(Update.ALL_TYPES)
+
+
+def allowed_updates_for(application):
+    """Update types the handlers registered on application can use"""
+    needed = set()
+    for group, handlers in application.handlers.items():
+        # Negative groups hold guards that see every update but need none
+        if group < 0:
+            continue
+        for handler in handlers:
+            needed |= _handler_update_types(handler)
+    return [t for t in Update.ALL_TYPES if t in needed]
+
+
+def restrict_update_types(application):
+    """Work out allowed_updates from the handlers and drop anything else.
+
+    Call after every handler is registered; returns the list to hand to
+    Telegram.
+    """
+    allowed = allowed_updates_for(application)
+    wanted = set(allowed)
+    dropped = {}
+
+    async def drop_unwanted(update, context):
+        kind = next((t for t in Update.ALL_TYPES if getattr(update, t, None) is not None), "unknown")
+        if kind in wanted:
+            return
+        dropped[kind] = dropped.get(kind, 0) + 1
+        logger.info(f"Dropped {kind} update ({dropped[kind]} so far), no handler uses it")
+        raise ApplicationHandlerStop
+
+    application.add_handler(TypeHandler(Update, drop_unwanted), group=UPDATE_GUARD_GROUP)
+    logger.info(f"Requesting update types: {', '.join(allowed)}")
+    return allowed
+
+
+def run_application(application, allowed_updates=None):
+    """Start application in the mode selected by BOT_MODE (polling or webhook)"""
+    if os.getenv("BOT_MODE", "polling").lower() == "webhook":
+        asyncio.run(run_webhook(application, allowed_updates))
+    else:
+        application.run_polling(allowed_updates=allowed_updates)
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Send a fake text message to a local webhook endpoint")
+    parser.add_argument("url", help="e.g. http://127.0.0.1:8443/bot/123456")
+    parser.add_argument("text", help="message text, e.g. /start")
+    parser.add_argument("--user", type=int, default=1, help="sender user id")
+    args = parser.parse_args()
+
+    async def run():
+        sender = WebhookSender(args.url, os.getenv("WEBHOOK_SECRET"))
+        try:
+            print(f"📨 {await sender.send(WebhookSender.message(args.user, args.text))}")
+        finally:
+            await sender.close()
+
+    asyncio.run(run())